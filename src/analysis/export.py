@@ -0,0 +1,312 @@
+import os
+import csv
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Iterator, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.services.utils.logger_utils import getLogger, hline
+from src.services.utils.redis_utils import get_redis_client, require_search
+from src.services.models.fire_event_index import EVENT_INDEX_SCHEMA, REDIS_EVENT_INDEX_ID
+from src.analysis.utils.dataframe import EVENT_FIELDS, EPOCH_FIELDS, NUMERIC_FIELDS, PAGE_SIZE
+from src.analysis.utils.query import EventQuery, schema_types
+
+logger = getLogger(__file__)
+
+EXPORT_FORMAT = os.environ.get("EXPORT_FORMAT", "parquet")
+# keys read per cursor page, documents fetched per pipeline
+EXPORT_PAGE_SIZE = int(os.environ.get("EXPORT_PAGE_SIZE", PAGE_SIZE))
+EXPORT_WORKERS = int(os.environ.get("EXPORT_WORKERS", 1))
+EXPORT_PROGRESS_INTERVAL = float(os.environ.get("EXPORT_PROGRESS_INTERVAL", 5))
+
+FORMATS = ("csv", "ndjson", "parquet")
+DATE_FIELD = "Incident_Date"
+
+# index-only numeric fields (longitude, latitude) are floats, FireEvent fields keep their type
+_INDEX_NUMERIC = {
+    name for name, (kind, _) in schema_types(EVENT_INDEX_SCHEMA).items()
+    if kind == "NUMERIC" and name not in EVENT_FIELDS
+}
+
+
+class _Progress:
+    def __init__(self, action: str):
+        self.action = action
+        self.start = self.last = time.time()
+        self.documents = 0
+
+    def add(self, documents: int) -> None:
+        self.documents += documents
+        if time.time() - self.last >= EXPORT_PROGRESS_INTERVAL:
+            self.last = time.time()
+            self.log()
+
+    def log(self) -> None:
+        elapsed = max(time.time() - self.start, 1e-9)
+        logger.info(f"{self.action}: {self.documents} documents ({self.documents / elapsed:.0f} docs/s).")
+
+
+def _convert(field: str, value: Optional[str]):
+    """
+    Typed value of a hash field written by hash_mapping, empty strings are missing values.
+    """
+    if value is None or value == "":
+        return None
+    try:
+        if field in EPOCH_FIELDS:
+            return datetime.fromtimestamp(float(value))
+        if field in NUMERIC_FIELDS:
+            return int(value)
+        if field in _INDEX_NUMERIC:
+            return float(value)
+    except ValueError:
+        return None
+    return value
+
+
+def arrow_schema(names: list[str]) -> pa.Schema:
+    def arrow_type(name: str) -> pa.DataType:
+        if name in EPOCH_FIELDS:
+            return pa.timestamp("us")
+        if name in NUMERIC_FIELDS:
+            return pa.int64()
+        if name in _INDEX_NUMERIC:
+            return pa.float64()
+        return pa.string()
+
+    return pa.schema([(name, arrow_type(name)) for name in names])
+
+
+class _CsvWriter:
+    def __init__(self, path: str, names: list[str]):
+        self.file = open(path, "w", newline="")
+        self.writer = csv.DictWriter(self.file, fieldnames=names)
+        self.writer.writeheader()
+
+    def write(self, rows: list[dict]) -> None:
+        self.writer.writerows(
+            {k: v.isoformat() if isinstance(v, datetime) else v for k, v in row.items()} for row in rows
+        )
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class _NdjsonWriter:
+    def __init__(self, path: str, names: list[str]):
+        self.file = open(path, "w")
+
+    def write(self, rows: list[dict]) -> None:
+        self.file.writelines(json.dumps(row, default=datetime.isoformat) + "\n" for row in rows)
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class _ParquetWriter:
+    def __init__(self, path: str, names: list[str]):
+        self.schema = arrow_schema(names)
+        # one row group per batch, the file is valid only once closed
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, rows: list[dict]) -> None:
+        self.writer.write_table(pa.Table.from_pylist(rows, schema=self.schema))
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+WRITERS = {"csv": _CsvWriter, "ndjson": _NdjsonWriter, "parquet": _ParquetWriter}
+
+
+def iter_keys(r, index: str, query: str, page_size: int = EXPORT_PAGE_SIZE) -> Iterator[list[str]]:
+    """
+    Keys of the documents matching query, one cursor page at a time.
+    Only the keys are transferred by RediSearch, the documents are read from the hashes.
+    """
+    require_search(r)
+    reply, cursor = r.execute_command(
+        "FT.AGGREGATE", index, query,
+        "LOAD", 1, "@__key",
+        "WITHCURSOR", "COUNT", page_size,
+        "DIALECT", 2,
+    )
+    while True:
+        keys = [row[1] for row in reply[1:] if row]
+        if keys:
+            yield keys
+        if not cursor:
+            return
+        reply, cursor = r.execute_command("FT.CURSOR", "READ", index, cursor, "COUNT", page_size)
+
+
+def fetch_documents(r, keys: list[str], names: list[str]) -> list[dict]:
+    """
+    Typed documents of keys with one pipelined HMGET each, keys deleted since
+    they were matched are left out.
+    """
+    pipe = r.pipeline(transaction=False)
+    for key in keys:
+        pipe.hmget(key, names)
+    rows = []
+    for values in pipe.execute():
+        if all(value is None for value in values):
+            continue
+        rows.append({name: _convert(name, value) for name, value in zip(names, values)})
+    return rows
+
+
+def date_span(r, index: str, query: str) -> tuple[Optional[float], Optional[float]]:
+    """
+    Smallest and largest Incident_Date epoch among the documents matching query.
+    """
+    require_search(r)
+    reply = r.execute_command(
+        "FT.AGGREGATE", index, query,
+        "GROUPBY", 0,
+        "REDUCE", "MIN", 1, f"@{DATE_FIELD}", "AS", "low",
+        "REDUCE", "MAX", 1, f"@{DATE_FIELD}", "AS", "high",
+        "DIALECT", 2,
+    )
+    if len(reply) < 2:
+        return None, None
+    row = dict(zip(reply[1][::2], reply[1][1::2]))
+    try:
+        return float(row["low"]), float(row["high"])
+    except (KeyError, TypeError, ValueError):  # no document with an Incident_Date
+        return None, None
+
+
+def date_ranges(low: float, high: float, parts: int) -> list[str]:
+    """
+    Split [low, high] into parts disjoint Incident_Date filters: every range is
+    right-open except the last one, so each document is exported once.
+    """
+    step = (high - low) / parts
+    bounds = [low + i * step for i in range(parts)] + [high]
+    ranges = [f"@{DATE_FIELD}:[{bounds[i]} ({bounds[i + 1]}]" for i in range(parts - 1)]
+    ranges.append(f"@{DATE_FIELD}:[{bounds[-2]} {high}]")
+    return ranges
+
+
+def part_path(path: str, part: int) -> str:
+    root, extension = os.path.splitext(path)
+    return f"{root}.part{part:03d}{extension}"
+
+
+def export_query(
+    query: str,
+    path: str,
+    fmt: str = EXPORT_FORMAT,
+    fields: Optional[list[str]] = None,
+    index: str = REDIS_EVENT_INDEX_ID,
+    page_size: int = EXPORT_PAGE_SIZE,
+) -> int:
+    """
+    Stream every document matching query to a CSV, NDJSON or Parquet file.
+
+    Keys are paged with an FT.AGGREGATE cursor and their hashes fetched with a
+    pipeline per page, so memory holds one page whatever the size of the export.
+    The file is written aside and renamed once complete.
+
+    :param query: RediSearch query, e.g. "@Battalion:{B09} @Incident_Date:[1577836800 +inf]".
+    :param fields: Exported fields, defaults to every FireEvent field.
+    :return: Number of exported documents.
+    """
+    if fmt not in WRITERS:
+        raise ValueError(f"Unknown export format {fmt}, expected one of {FORMATS}")
+    names = list(fields or EVENT_FIELDS)
+    r = get_redis_client()
+    progress = _Progress(f"Exported to {path}")
+    writer = WRITERS[fmt](f"{path}.tmp", names)
+    try:
+        for keys in iter_keys(r, index, query, page_size):
+            rows = fetch_documents(r, keys, names)
+            if rows:
+                writer.write(rows)
+            progress.add(len(rows))
+    finally:
+        writer.close()
+    os.replace(f"{path}.tmp", path)
+    progress.log()
+    return progress.documents
+
+
+def export(
+    query: str,
+    path: str,
+    fmt: str = EXPORT_FORMAT,
+    fields: Optional[list[str]] = None,
+    workers: int = EXPORT_WORKERS,
+    index: str = REDIS_EVENT_INDEX_ID,
+) -> dict[str, int]:
+    """
+    Export query to path, or with several workers to one part file per disjoint
+    Incident_Date range (path.part000.ext, ...) written in parallel. Documents
+    without an Incident_Date are not part of any range and are left out of a
+    parallel export.
+
+    :return: Number of exported documents per file.
+    """
+    if workers <= 1:
+        return {path: export_query(query, path, fmt, fields, index)}
+    low, high = date_span(get_redis_client(), index, query)
+    if low is None:
+        logger.warning(f"No {DATE_FIELD} to split {query!r} on, exporting with a single worker.")
+        return {path: export_query(query, path, fmt, fields, index)}
+    ranges = date_ranges(low, high, workers) if high > low else [f"@{DATE_FIELD}:[{low} {high}]"]
+    queries = [query_range if query.strip() == "*" else f"({query}) {query_range}" for query_range in ranges]
+    paths = [part_path(path, part) for part in range(len(queries))]
+    logger.info(f"Exporting {query!r} in {len(queries)} parts with {workers} workers.")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(export_query, q, p, fmt, fields, index) for q, p in zip(queries, paths)]
+        return {p: future.result() for p, future in zip(paths, futures)}
+
+
+def build_query(args) -> str:
+    query = EventQuery()
+    if args.battalion:
+        query.tag("Battalion", *args.battalion)
+    if args.district:
+        query.tag("neighborhood_district", *args.district)
+    if args.since or args.until:
+        since = datetime.fromisoformat(args.since) if args.since else None
+        until = datetime.fromisoformat(args.until) if args.until else None
+        query.range(DATE_FIELD, since, until)
+    filters = query.filters + ([args.query] if args.query else [])
+    return " ".join(filters) or "*"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=f"Stream the documents of {REDIS_EVENT_INDEX_ID} matching a filter to a file.")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=FORMATS, default=EXPORT_FORMAT)
+    parser.add_argument("--query", help='raw RediSearch filter, e.g. "@ID:[1000 2000]"')
+    parser.add_argument("--battalion", nargs="+", help="any of these battalions")
+    parser.add_argument("--district", nargs="+", help="any of these neighborhood districts")
+    parser.add_argument("--since", help="Incident_Date lower bound, ISO format")
+    parser.add_argument("--until", help="Incident_Date upper bound, ISO format")
+    parser.add_argument("--fields", nargs="+", help="exported fields, defaults to every event field")
+    parser.add_argument("--workers", type=int, default=EXPORT_WORKERS, help="parallel Incident_Date ranges")
+    args = parser.parse_args()
+
+    if args.fields:
+        EventQuery().select(*args.fields)  # rejects unknown fields
+    query = build_query(args)
+    start = time.time()
+    counts = export(query, args.path, args.format, args.fields, args.workers)
+    hline()
+    for path, documents in counts.items():
+        logger.info(f"{path}: {documents} documents")
+    logger.info(f"{query!r}: {sum(counts.values())} documents in {time.time() - start:.1f}s")
+    hline()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
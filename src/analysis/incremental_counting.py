@@ -0,0 +1,166 @@
+import os
+import json
+import time
+import zlib
+from collections import Counter
+
+from confluent_kafka import Consumer, TopicPartition
+
+from src.services.utils.logger_utils import getLogger, hline
+from src.services.utils.redis_utils import get_redis_client, hash_tag
+from src.services.utils.kafka_utils import create_consumer_config
+
+logger = getLogger(__file__)
+
+SERVICE_NAME = os.environ.get("SERVICE_NAME", "incremental_counting")
+
+VALIDATED_EVENTS_TOPIC = os.getenv("VALIDATED_EVENTS_TOPIC", "validated-fire-events")
+COUNTER_KEY_PREFIX = os.getenv("COUNTER_KEY_PREFIX", "fireevent:counts")
+BATCH_SIZE = int(os.environ.get("BATCH_SIZE", 10000))
+POLL_TIMEOUT = float(os.environ.get("POLL_TIMEOUT", 5))
+TOP_N = int(os.environ.get("TOP_N", 10))
+# counters and checkpoints split in hash-tagged shards spread over the cluster
+# nodes, changing it requires a RESTART
+COUNTER_SHARDS = int(os.environ.get("COUNTER_SHARDS", 1))
+RESTART = os.environ.get("RESTART", "False").lower() == "true"
+
+# counter name -> message field
+COUNTED_FIELDS = {"incident_number": "Incident Number", "id": "ID"}
+
+r = get_redis_client()
+
+
+def counter_key(name: str, shard: int) -> str:
+    return f"{COUNTER_KEY_PREFIX}:{hash_tag(f'shard{shard}')}:{name}"
+
+
+def checkpoint_key(shard: int) -> str:
+    # same hash tag as the counters of the shard, they are updated in one transaction
+    return f"{COUNTER_KEY_PREFIX}:{hash_tag(f'shard{shard}')}:checkpoint:{VALIDATED_EVENTS_TOPIC}"
+
+
+def shard_of(value: str) -> int:
+    return zlib.crc32(value.encode()) % COUNTER_SHARDS
+
+
+def load_checkpoints() -> list[dict[int, int]]:
+    """
+    Next offset to read per partition of VALIDATED_EVENTS_TOPIC, per shard.
+    """
+    return [
+        {int(p): int(o) for p, o in r.hgetall(checkpoint_key(shard)).items()}
+        for shard in range(COUNTER_SHARDS)
+    ]
+
+
+def save_batch(counts: list[dict[str, Counter]], offsets: dict[int, int], checkpoints: list[dict[int, int]]) -> None:
+    """
+    Add a batch to the counters and move the checkpoint of every shard in one
+    MULTI/EXEC per shard, so a crash never counts a message twice nor loses one.
+    """
+    for shard, shard_counts in enumerate(counts):
+        pipe = r.pipeline(transaction=True)
+        for name, counter in shard_counts.items():
+            for value, count in counter.items():
+                pipe.zincrby(counter_key(name, shard), count, value)
+        pipe.hset(checkpoint_key(shard), mapping=offsets)
+        pipe.execute()
+        checkpoints[shard].update(offsets)
+
+
+def assign_from_checkpoint(consumer: Consumer, checkpoints: list[dict[int, int]]) -> dict[int, int]:
+    """
+    Assign every partition at its oldest shard checkpoint (shards saved before
+    a crash skip the messages they already counted).
+    :return: High watermark per partition with messages left to read.
+    """
+    metadata = consumer.list_topics(topic=VALIDATED_EVENTS_TOPIC, timeout=10)
+    assignment = []
+    targets = {}
+    for partition in metadata.topics[VALIDATED_EVENTS_TOPIC].partitions:
+        tp = TopicPartition(VALIDATED_EVENTS_TOPIC, partition)
+        low, high = consumer.get_watermark_offsets(tp, timeout=10)
+        start = max(min(checkpoint.get(partition, low) for checkpoint in checkpoints), low)
+        logger.info(f"partition {partition}: checkpoint {start}, high watermark {high}")
+        if start < high:
+            targets[partition] = high
+            assignment.append(TopicPartition(VALIDATED_EVENTS_TOPIC, partition, start))
+    consumer.assign(assignment)
+    return targets
+
+
+def count_delta() -> int:
+    """
+    Count the messages published since the last checkpoint, up to the high
+    watermarks seen at start, then stop.
+    :return: Number of counted messages.
+    """
+    config = create_consumer_config(consumer_group=SERVICE_NAME)
+    config["enable.auto.commit"] = False  # the checkpoint lives in Redis with the counters
+    consumer = Consumer(config)
+    checkpoints = load_checkpoints()
+    targets = assign_from_checkpoint(consumer, checkpoints)
+    counted = 0
+    start_time = time.time()
+    try:
+        while targets:
+            messages = consumer.consume(num_messages=BATCH_SIZE, timeout=POLL_TIMEOUT)
+            if not messages:
+                logger.warning(f"No message received in {POLL_TIMEOUT}s, remaining partitions: {list(targets)}")
+                break
+            counts = [{name: Counter() for name in COUNTED_FIELDS} for _ in range(COUNTER_SHARDS)]
+            offsets = {}
+            for msg in messages:
+                if msg.error():
+                    logger.error(f"Kafka error: {msg.error()}")
+                    continue
+                if msg.partition() not in targets or msg.offset() >= targets[msg.partition()]:
+                    continue
+                data = json.loads(msg.value())
+                for name, column in COUNTED_FIELDS.items():
+                    if data.get(column):
+                        value = str(data[column])
+                        shard = shard_of(value)
+                        if msg.offset() >= checkpoints[shard].get(msg.partition(), 0):
+                            counts[shard][name][value] += 1
+                offsets[msg.partition()] = msg.offset() + 1
+                counted += 1
+            if offsets:
+                save_batch(counts, offsets, checkpoints)
+            for partition, offset in offsets.items():
+                if offset >= targets[partition]:
+                    targets.pop(partition)
+            logger.info(f"Counted {counted} messages ({counted / (time.time() - start_time):.0f} msg/s).")
+    finally:
+        consumer.close()
+    return counted
+
+
+def report() -> None:
+    # a value is counted in a single shard: totals add up and the top N is in the shards' top N
+    for name in COUNTED_FIELDS:
+        keys = [counter_key(name, shard) for shard in range(COUNTER_SHARDS)]
+        hline(header=f"count by {name}")
+        distinct = sum(r.zcard(key) for key in keys)
+        repeated = sum(r.zcount(key, 2, "+inf") for key in keys)
+        logger.info(f"distinct: {distinct}, repeated: {repeated}")
+        top = [item for key in keys for item in r.zrevrange(key, 0, TOP_N - 1, withscores=True)]
+        for value, count in sorted(top, key=lambda item: item[1], reverse=True)[:TOP_N]:
+            logger.info(f"{value}: {int(count)}")
+    hline()
+
+
+def main():
+    if RESTART:
+        r.delete(
+            *[checkpoint_key(shard) for shard in range(COUNTER_SHARDS)],
+            *[counter_key(name, shard) for name in COUNTED_FIELDS for shard in range(COUNTER_SHARDS)],
+        )
+        logger.info("Counters and checkpoint deleted.")
+    counted = count_delta()
+    logger.info(f"{counted} new messages counted.")
+    report()
+
+
+if __name__ == "__main__":
+    main()
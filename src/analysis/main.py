@@ -1,25 +1,83 @@
 import os
+import glob
+import tempfile
 import pandas as pc
 
+from concurrent.futures import ProcessPoolExecutor
 
-data = pc.read_csv("/home/caleb/workspace/tests/ntdsoftware/mount/worker/firedata/Fire_Incidents_20250530.csv")
+from src.services.utils.logger_utils import getLogger, hline
+from src.analysis.utils.aggregation import Aggregation, aggregate_df
 
+logger = getLogger(__file__)
 
-print(data.head())
-
-count_by_incident_number = (
-    data.groupby("Incident Number") 
-    .size()
-    .reset_index(name="count")
-    .sort_values(by="count", ascending=False)
+DATASET_PATH = os.environ.get(
+    "DATASET_PATH", "/data/fire_events/Fire_Incidents_20250530.csv"
 )
-print(count_by_incident_number.head(10))
+CHUNK_SIZE = int(os.environ.get("CHUNK_SIZE", 200000))
+PARTITIONS = int(os.environ.get("PARTITIONS", 16))
+WORKERS = int(os.environ.get("WORKERS", 1))
+TOP_N = int(os.environ.get("TOP_N", 10))
+
+# only the counted columns are read, with compact dtypes
+COLUMNS = {"Incident Number": "string", "ID": "string"}
+
+
+def spill_chunk(chunk: pc.DataFrame, number: int, folder: str) -> int:
+    """
+    Count one chunk and spill the partial counts to hash partitions, so every key
+    of a column ends up in exactly one partition.
+    """
+    for column in COLUMNS:
+        counts = aggregate_df(chunk, Aggregation(group_by=[column]))
+        partition = pc.util.hash_pandas_object(counts[column], index=False) % PARTITIONS
+        for p, part in counts.groupby(partition.values):
+            part.to_pickle(os.path.join(folder, f"{column}-{p}-{number}.pkl"))
+    return len(chunk)
+
+
+def top_partition(column: str, partition: int, folder: str) -> pc.DataFrame:
+    """
+    Merge the partial counts of one partition into exact counts and keep its top N.
+    """
+    files = glob.glob(os.path.join(folder, f"{column}-{partition}-*.pkl"))
+    if not files:
+        return pc.DataFrame(columns=[column, "count"])
+    partials = pc.concat([pc.read_pickle(f) for f in files], ignore_index=True)
+    return aggregate_df(
+        partials,
+        Aggregation(group_by=[column], reducers={"count": ("SUM", "count")}, sort_by="count", limit=TOP_N),
+    )
+
+
+def main():
+    logger.info(
+        f"Counting {DATASET_PATH} in chunks of {CHUNK_SIZE} rows "
+        f"({PARTITIONS} partitions, {WORKERS} workers)."
+    )
+    with tempfile.TemporaryDirectory() as folder, ProcessPoolExecutor(max_workers=WORKERS) as pool:
+        chunks = pc.read_csv(
+            DATASET_PATH, usecols=list(COLUMNS), dtype=COLUMNS, chunksize=CHUNK_SIZE
+        )
+        futures = []
+        read_rows = 0
+        for number, chunk in enumerate(chunks):
+            futures.append(pool.submit(spill_chunk, chunk, number, folder))
+            # keep at most a few chunks in flight to bound memory
+            if len(futures) >= WORKERS * 2:
+                read_rows += futures.pop(0).result()
+                logger.info(f"Counted {read_rows} rows so far.")
+        read_rows += sum(f.result() for f in futures)
+        logger.info(f"Counted {read_rows} rows.")
+
+        for column in COLUMNS:
+            tops = pool.map(top_partition, [column] * PARTITIONS, range(PARTITIONS), [folder] * PARTITIONS)
+            top = aggregate_df(
+                pc.concat(list(tops), ignore_index=True),
+                Aggregation(group_by=[column], reducers={"count": ("SUM", "count")}, sort_by="count", limit=TOP_N),
+            )
+            hline(header=f"count by {column}")
+            logger.info(f"\n{top}")
 
-count_by_incident_number = (
-    data.groupby("ID")
-    .size()
-    .reset_index(name="count")
-    .sort_values(by="count", ascending=False)
-)
 
-print(count_by_incident_number.head(10))
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,9 @@ import os
 from datetime import datetime
 
 
-from src.analysis.utils.dataframe import redis_result_to_df
+from src.analysis.utils.aggregation import Aggregation
+from src.analysis.utils.cache import cached_query, cached_aggregate, query_cache
+from src.analysis.utils.query import EventQuery
 from src.services.utils.logger_utils import getLogger, hline
 
 import redis
@@ -49,22 +51,30 @@ hline(header="general index information")
 
 
 hline(header="QUERY: @Battalion:{B09}")
-query = ["FT.SEARCH", REDIS_EVENT_INDEX_ID, "@Battalion:{B09}"]
-logger.debug(query)
-battalionB09 = r.execute_command(*query)
-# logger.info(battalionB09)
+# only the fields used below are returned, every page is read
+b09 = EventQuery(REDIS_EVENT_INDEX_ID).tag("Battalion", "B09").select("Incident_Number", "Exposure_Number", "ID")
+query = b09.query_string()
+logger.debug(b09)
+df = cached_query(r, b09)
 hline()
-df, docs = redis_result_to_df(battalionB09)
-# logger.info(docs)
 df = df.sort_values(by=["Incident_Number", "Exposure_Number"])
 logger.debug(df[["Incident_Number", "Exposure_Number"]].head())
 hline()
 logger.info("Max id by incident_number")
-incident_number_counter = df.groupby("Incident_Number").agg(
-    max=("ID", 'max'),
-    count=('ID', 'count')
-).reset_index()
-logger.info(incident_number_counter[incident_number_counter['count']>1].head())
+# grouped by RediSearch, only the repeated incidents are transferred
+incident_number_counter = cached_aggregate(
+    r,
+    REDIS_EVENT_INDEX_ID,
+    query,
+    Aggregation(
+        group_by=["Incident_Number"],
+        reducers={"max": ("MAX", "ID"), "count": ("COUNT", None)},
+        having="@count > 1",
+        sort_by="count",
+        limit=5,
+    ),
+)
+logger.info(incident_number_counter)
 hline()
 logger.info(f"Result keys: {df.keys()}")
 logger.info(f"Count: {df.size}")
@@ -72,25 +82,20 @@ logger.info(f"Count: {df.size}")
 
 hline(header="QUERY: @Battalion:{B09} 2025 excelsior dt events")
 
-start = datetime.fromisoformat("2024-01-01T00:00:00").timestamp()
+start = datetime.fromisoformat("2024-01-01T00:00:00")
 logger.info(f"start: {start}")
 
-filter = f"@Incident_Date:[{start} +inf] @Battalion:{{B09}} @neighborhood_district:{{Excelsior}}"
-
-query = [
-    "FT.SEARCH",
-    REDIS_EVENT_INDEX_ID,
-    filter,
-    "RETURN",
-    "5",
-    "Incident_Number",
-    "neighborhood_district",
-    "Alarm_DtTm",
-    "Incident_Date",
-    "Battalion",
-]
-logger.info(" ".join(query))
-res = r.execute_command(*query)
-df,_ = redis_result_to_df(res)
+excelsior = (
+    EventQuery(REDIS_EVENT_INDEX_ID)
+    .range("Incident_Date", low=start)
+    .tag("Battalion", "B09")
+    .tag("neighborhood_district", "Excelsior")
+    .select("Incident_Number", "neighborhood_district", "Alarm_DtTm", "Incident_Date", "Battalion")
+    .sort_by("Incident_Date")
+)
+logger.info(excelsior)
+# older events live in cold storage once tiered out of Redis
+df = cached_query(r, excelsior, tiered=True)
 logger.info(df.head())
 hline(header="QUERY: @Battalion:{B09}")
+logger.debug(f"query cache: {query_cache.stats()}")
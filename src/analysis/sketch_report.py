@@ -0,0 +1,59 @@
+import os
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from src.services.utils.logger_utils import getLogger, hline
+from src.services.utils.redis_utils import get_redis_client
+from src.services.utils.sketch_utils import EventSketches, DAY_FORMAT
+
+logger = getLogger(__file__)
+
+# days reported, counted back from REPORT_END (default: today)
+REPORT_DAYS = int(os.environ.get("REPORT_DAYS", 30))
+REPORT_END = os.environ.get("REPORT_END")
+TOP_N = int(os.environ.get("TOP_N", 10))
+
+r = get_redis_client()
+sketches = EventSketches(r)
+
+
+def dimension_values(dimension: str) -> list[str]:
+    """
+    Battalions or districts having at least one daily HyperLogLog.
+    """
+    pattern = f"{sketches.prefix}:hll:{dimension}:*"
+    return sorted({key.rsplit(":", 2)[-2] for key in r.scan_iter(match=pattern, count=1000)})
+
+
+def main():
+    end = datetime.strptime(REPORT_END, DAY_FORMAT) if REPORT_END else datetime.now()
+    start = end - timedelta(days=REPORT_DAYS - 1)
+
+    hline(header="distinct incidents")
+    logger.info(
+        f"{start.strftime(DAY_FORMAT)} - {end.strftime(DAY_FORMAT)}: "
+        f"{sketches.distinct_incidents(start, end)}"
+    )
+    for dimension in ["battalion", "district"]:
+        hline(header=f"distinct incidents by {dimension}")
+        counts = pd.DataFrame(
+            [
+                (value, sketches.distinct_incidents(start, end, **{dimension: value}))
+                for value in dimension_values(dimension)
+            ],
+            columns=[dimension, "distinct_incidents"],
+        )
+        logger.info(f"\n{counts.sort_values('distinct_incidents', ascending=False).head(TOP_N)}")
+
+    for dimension in ["incident_number", "id"]:
+        hline(header=f"most frequent {dimension}")
+        top = pd.DataFrame(sketches.top(dimension)[:TOP_N], columns=[dimension, "count"])
+        # Count-Min estimates are never below the true count
+        top["cms_count"] = sketches.frequency(dimension, *top[dimension]) if len(top) else []
+        logger.info(f"\n{top}")
+    hline()
+
+
+if __name__ == "__main__":
+    main()
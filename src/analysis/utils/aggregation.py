@@ -0,0 +1,128 @@
+import os
+import pandas as pd
+import redis.exceptions
+
+from dataclasses import dataclass, field
+from typing import Optional
+
+from src.services.utils.logger_utils import getLogger
+from src.analysis.utils.dataframe import index_field_types, search_to_df
+
+logger = getLogger(__file__)
+
+# rows kept by an unlimited SORTBY, FT.AGGREGATE sorts only its first 10 rows by default
+AGGREGATE_SORT_MAX = int(os.environ.get("AGGREGATE_SORT_MAX", 1_000_000))
+
+# RediSearch reducer -> pandas aggregation
+PANDAS_REDUCERS = {
+    "COUNT": "size",
+    "COUNT_DISTINCT": "nunique",
+    "SUM": "sum",
+    "MIN": "min",
+    "MAX": "max",
+    "AVG": "mean",
+}
+
+
+@dataclass
+class Aggregation:
+    """
+    A group-by analytic, runnable server-side (FT.AGGREGATE) or on a DataFrame.
+
+    example: top 10 repeated incidents with their highest row ID
+        Aggregation(
+            group_by=["Incident_Number"],
+            reducers={"count": ("COUNT", None), "max": ("MAX", "ID")},
+            having="@count > 1",
+            sort_by="count",
+            limit=10,
+        )
+    """
+
+    group_by: list[str]
+    # alias -> (reducer, field), field is None for COUNT
+    reducers: dict[str, tuple[str, Optional[str]]] = field(
+        default_factory=lambda: {"count": ("COUNT", None)}
+    )
+    having: Optional[str] = None  # FT.AGGREGATE FILTER expression on group_by/aliases
+    sort_by: Optional[str] = None
+    ascending: bool = False
+    limit: Optional[int] = None
+
+    def fields(self) -> list[str]:
+        return list(dict.fromkeys(self.group_by + [f for _, f in self.reducers.values() if f]))
+
+    def to_args(self, loaded: list[str]) -> list:
+        """
+        FT.AGGREGATE arguments following the query.
+        :param loaded: Fields not in the index, loaded from the hashes first.
+        """
+        args: list = []
+        if loaded:
+            args += ["LOAD", len(loaded), *[f"@{f}" for f in loaded]]
+        args += ["GROUPBY", len(self.group_by), *[f"@{f}" for f in self.group_by]]
+        for alias, (reducer, source) in self.reducers.items():
+            reducer_args = [f"@{source}"] if source else []
+            args += ["REDUCE", reducer, len(reducer_args), *reducer_args, "AS", alias]
+        if self.having:
+            args += ["FILTER", self.having]
+        if self.sort_by:
+            args += ["SORTBY", 2, f"@{self.sort_by}", "ASC" if self.ascending else "DESC"]
+            args += ["MAX", self.limit or AGGREGATE_SORT_MAX]
+        if self.limit:
+            args += ["LIMIT", 0, self.limit]
+        return args
+
+
+def _typed(df: pd.DataFrame, columns) -> pd.DataFrame:
+    # reducers reply with strings, group values keep their original form
+    for column in columns:
+        df[column] = pd.to_numeric(df[column], errors="coerce")
+    return df
+
+
+def aggregate_df(df: pd.DataFrame, aggregation: Aggregation) -> pd.DataFrame:
+    """
+    Run an aggregation on a DataFrame (pandas fallback of aggregate).
+    """
+    named = {
+        alias: (source or aggregation.group_by[0], PANDAS_REDUCERS[reducer])
+        for alias, (reducer, source) in aggregation.reducers.items()
+    }
+    result = df.groupby(aggregation.group_by, observed=True).agg(**named).reset_index()
+    if aggregation.having:
+        result = result.query(aggregation.having.replace("@", ""))
+    if aggregation.sort_by:
+        if aggregation.limit and not aggregation.ascending:
+            return result.nlargest(aggregation.limit, aggregation.sort_by).reset_index(drop=True)
+        result = result.sort_values(aggregation.sort_by, ascending=aggregation.ascending)
+    if aggregation.limit:
+        result = result.head(aggregation.limit)
+    return result.reset_index(drop=True)
+
+
+def aggregate(r, index: str, query: str, aggregation: Aggregation) -> pd.DataFrame:
+    """
+    Run an aggregation server-side with FT.AGGREGATE, only the aggregated rows
+    are transferred. Falls back to loading the needed fields and aggregating in
+    pandas when Redis rejects the request (e.g. an unsupported reducer).
+
+    :param r: Redis client (decode_responses=True).
+    :param index: RediSearch index name.
+    :param query: RediSearch query selecting the documents, "*" for all.
+    :param aggregation: The analytic to run.
+    :return: One row per group, with group_by columns and reducer aliases.
+    """
+    indexed = index_field_types(r, index)
+    loaded = [f for f in aggregation.fields() if f not in indexed]
+    args = ["FT.AGGREGATE", index, query, *aggregation.to_args(loaded)]
+    logger.debug(" ".join(str(a) for a in args))
+    try:
+        reply = r.execute_command(*args)
+    except redis.exceptions.ResponseError as err:
+        logger.warning(f"FT.AGGREGATE failed ({err}), aggregating in pandas.")
+        df = search_to_df(r, index, query, return_fields=aggregation.fields())
+        return aggregate_df(df, aggregation)
+    rows = [dict(zip(row[::2], row[1::2])) for row in reply[1:]]
+    columns = aggregation.group_by + list(aggregation.reducers.keys())
+    return _typed(pd.DataFrame(rows, columns=columns), aggregation.reducers.keys())
@@ -0,0 +1,245 @@
+import io
+import os
+import re
+import sys
+import hashlib
+import threading
+
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+import pandas as pd
+import redis
+
+from src.services.utils.logger_utils import getLogger
+from src.services.utils.redis_utils import ALL_PARTITIONS, day_partition, get_generations, get_redis_client
+from src.analysis.utils.dataframe import search_to_df
+from src.analysis.utils.aggregation import Aggregation, aggregate
+from src.analysis.utils.query import EventQuery
+from src.analysis.utils.tiered import tiered_query
+
+logger = getLogger(__file__)
+
+QUERY_CACHE = os.environ.get("QUERY_CACHE", "True").lower() == "true"
+QUERY_CACHE_MAX_ENTRIES = int(os.environ.get("QUERY_CACHE_MAX_ENTRIES", 128))
+QUERY_CACHE_MAX_BYTES = int(os.environ.get("QUERY_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+# written by fire_event_data_serving (REDIS_GENERATION_KEY)
+QUERY_CACHE_GENERATION_KEY = os.environ.get("QUERY_CACHE_GENERATION_KEY", "fireevent:generation")
+# date ranges spanning more days depend on the global generation instead
+QUERY_CACHE_MAX_DAYS = int(os.environ.get("QUERY_CACHE_MAX_DAYS", 366))
+# results shared in Redis between processes and runs, as Parquet strings (not indexed,
+# the event index only covers hashes); stale entries are never read again and expire
+QUERY_CACHE_SHARED = os.environ.get("QUERY_CACHE_SHARED", "True").lower() == "true"
+QUERY_CACHE_KEY_PREFIX = os.environ.get("QUERY_CACHE_KEY_PREFIX", "fireevent:querycache")
+QUERY_CACHE_TTL = int(os.environ.get("QUERY_CACHE_TTL", 3600))
+QUERY_CACHE_SHARED_MAX_BYTES = int(os.environ.get("QUERY_CACHE_SHARED_MAX_BYTES", 32 * 1024 * 1024))
+
+PARTITION_FIELD = "Incident_Date"
+_RANGE = re.compile(rf"(-?)@{PARTITION_FIELD}:\[\s*(\(?[^\s\]]+)\s+(\(?[^\s\]]+)\s*\]")
+
+
+def _top_level_terms(query: str) -> list[str]:
+    terms, depth, current = [], 0, []
+    for char in query:
+        if char in "([{":
+            depth += 1
+        elif char in ")]}":
+            depth -= 1
+        if char.isspace() and depth == 0:
+            if current:
+                terms.append("".join(current))
+            current = []
+        else:
+            current.append(char)
+    if current:
+        terms.append("".join(current))
+    return terms
+
+
+def normalize_query(query: str) -> str:
+    """
+    Canonical form of a RediSearch query: whitespace collapsed and, for plain
+    intersections, top-level terms sorted ("@a:{x} @b:{y}" == "@b:{y}  @a:{x}").
+    """
+    terms = _top_level_terms(" ".join(query.split()))
+    if "|" not in query:
+        terms = sorted(terms)
+    return " ".join(terms)
+
+
+def query_partitions(query: str) -> list[str]:
+    """
+    Incident_Date days a query can match, or [ALL_PARTITIONS] when it is not
+    restricted to a bounded range of days.
+    """
+    ranges = _RANGE.findall(query)
+    if len(ranges) != 1 or "|" in query:
+        return [ALL_PARTITIONS]
+    negated, low, high = ranges[0]
+    try:
+        low, high = float(low.lstrip("(")), float(high.lstrip("("))
+    except ValueError:
+        return [ALL_PARTITIONS]
+    if negated or low in (float("inf"), float("-inf")) or high in (float("inf"), float("-inf")):
+        return [ALL_PARTITIONS]
+    start, end = datetime.fromtimestamp(low).date(), datetime.fromtimestamp(high).date()
+    days = (end - start).days + 1
+    if days <= 0 or days > QUERY_CACHE_MAX_DAYS:
+        return [ALL_PARTITIONS]
+    return [day_partition(start + timedelta(days=i)) for i in range(days)]
+
+
+class QueryCache:
+    """
+    Cache of analysis query results in two levels: an in-process LRU bounded by
+    entries and bytes, and DataFrames shared in Redis by every process and run.
+
+    Entries are keyed by index, normalized query and projection, and remember
+    the write generations of the Incident_Date days the query depends on. A hit
+    costs one HMGET of those generations (plus one GET for a shared hit); an
+    entry whose days were written since is recomputed. Shared entries have the
+    generations in their key, a write makes the next reads miss and the stale
+    entry expires after QUERY_CACHE_TTL.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = QUERY_CACHE_MAX_ENTRIES,
+        max_bytes: int = QUERY_CACHE_MAX_BYTES,
+        generation_key: str = QUERY_CACHE_GENERATION_KEY,
+        shared: bool = QUERY_CACHE_SHARED,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.generation_key = generation_key
+        self.shared = shared
+        self._entries: OrderedDict = OrderedDict()  # key -> (generations, value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _size(value) -> int:
+        if isinstance(value, pd.DataFrame):
+            return int(value.memory_usage(deep=True).sum())
+        return sys.getsizeof(value)
+
+    def _evict(self) -> None:
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, (_, _, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+
+    @staticmethod
+    def _shared_key(key: tuple, generations: tuple) -> str:
+        digest = hashlib.sha1(repr((key, generations)).encode()).hexdigest()
+        return f"{QUERY_CACHE_KEY_PREFIX}:{digest}"
+
+    def _shared_get(self, shared_key: str) -> Optional[pd.DataFrame]:
+        try:
+            payload = get_redis_client(decode_responses=False).get(shared_key)
+            return pd.read_parquet(io.BytesIO(payload)) if payload is not None else None
+        except (redis.exceptions.RedisError, ValueError, OSError) as err:
+            logger.warning(f"Shared query cache read of {shared_key} failed: {err}")
+            return None
+
+    def _shared_set(self, shared_key: str, value) -> None:
+        if not isinstance(value, pd.DataFrame):
+            return
+        try:
+            buffer = io.BytesIO()
+            value.to_parquet(buffer)
+            payload = buffer.getvalue()
+            if len(payload) <= QUERY_CACHE_SHARED_MAX_BYTES:
+                get_redis_client(decode_responses=False).set(shared_key, payload, ex=QUERY_CACHE_TTL)
+        except (redis.exceptions.RedisError, ValueError, TypeError, OSError) as err:
+            logger.warning(f"Shared query cache write of {shared_key} failed: {err}")
+
+    def get_or_compute(self, index: str, query: str, projection, compute: Callable):
+        """
+        Cached result of compute() for (index, query, projection).
+        """
+        key = (index, normalize_query(query), repr(projection))
+        generations = get_generations(self.generation_key, query_partitions(query))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] == generations:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1].copy() if isinstance(entry[1], pd.DataFrame) else entry[1]
+        shared_key = self._shared_key(key, generations) if self.shared else None
+        value = self._shared_get(shared_key) if shared_key else None
+        if value is not None:
+            with self._lock:
+                self.shared_hits += 1
+        else:
+            value = compute()
+            with self._lock:
+                self.misses += 1
+            if shared_key:
+                self._shared_set(shared_key, value)
+        size = self._size(value)
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[2]
+            if size <= self.max_bytes:
+                self._entries[key] = (generations, value, size)
+                self._bytes += size
+                self._evict()
+        return value.copy() if isinstance(value, pd.DataFrame) else value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+query_cache = QueryCache()
+
+
+def cached_search_to_df(r, index: str, query: str, return_fields: Optional[list[str]] = None) -> pd.DataFrame:
+    """
+    search_to_df served from query_cache while the matched days are unchanged.
+    """
+    if not QUERY_CACHE:
+        return search_to_df(r, index, query, return_fields=return_fields)
+    return query_cache.get_or_compute(
+        index, query, ("search", return_fields), lambda: search_to_df(r, index, query, return_fields=return_fields)
+    )
+
+
+def cached_aggregate(r, index: str, query: str, aggregation: Aggregation) -> pd.DataFrame:
+    """
+    aggregate served from query_cache while the matched days are unchanged.
+    """
+    if not QUERY_CACHE:
+        return aggregate(r, index, query, aggregation)
+    return query_cache.get_or_compute(
+        index, query, ("aggregate", aggregation), lambda: aggregate(r, index, query, aggregation)
+    )
+
+
+def cached_query(r, query: EventQuery, tiered: bool = False) -> pd.DataFrame:
+    """
+    EventQuery.execute served from query_cache while the matched days are unchanged.
+    :param tiered: Merge cold storage results too (see tiered_query), tiering bumps
+        the generations of the days it moves so cached merges stay valid.
+    """
+    run = (lambda: tiered_query(r, query)) if tiered else (lambda: query.execute(r))
+    if not QUERY_CACHE:
+        return run()
+    return query_cache.get_or_compute(query.index, query.query_string(), (tiered, query.args()), run)
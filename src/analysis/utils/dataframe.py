@@ -1,5 +1,21 @@
+import os
 import pandas as pd
 
+from dataclasses import fields
+from typing import Iterator, Optional
+
+from src.services.models.fire_event import FireEvent
+from src.services.utils.redis_utils import require_search
+
+PAGE_SIZE = int(os.getenv("REDIS_SEARCH_PAGE_SIZE", 1000))
+
+# every hash field written by the serving layer (see store_as_hash)
+EVENT_FIELDS = [f.name for f in fields(FireEvent)]
+# datetimes are stored as epoch floats, ints as their string representation
+EPOCH_FIELDS = {f.name for f in fields(FireEvent) if "datetime" in str(f.type)}
+NUMERIC_FIELDS = {f.name for f in fields(FireEvent) if "int" in str(f.type)}
+
+
 def redis_result_to_df(raw_result):
     num_results = raw_result[0]
     data = raw_result[1:]
@@ -18,3 +34,118 @@ def redis_result_to_df(raw_result):
     # Create DataFrame
     df = pd.DataFrame(docs)
     return df, docs
+
+
+def index_field_types(r, index: str) -> dict[str, str]:
+    """
+    Field types (TAG, NUMERIC, TEXT, ...) declared by a RediSearch index.
+    """
+    require_search(r)
+    info = r.execute_command("FT.INFO", index)
+    info = dict(zip(info[::2], info[1::2]))
+    types = {}
+    for attribute in info.get("attributes", []):
+        attribute = dict(zip(attribute[::2], attribute[1::2]))
+        types[attribute["attribute"]] = attribute["type"]
+    return types
+
+
+def typed_columns(columns: dict[str, list], field_types: dict[str, str]) -> pd.DataFrame:
+    """
+    Build a DataFrame from raw string columns: epoch fields become datetimes,
+    numeric fields numbers and tag fields categoricals. Empty strings are missing values.
+    """
+    data = {}
+    for name, values in columns.items():
+        column = pd.Series(values, dtype="object")
+        if name in EPOCH_FIELDS:
+            column = pd.to_datetime(pd.to_numeric(column, errors="coerce"), unit="s")
+        elif name in NUMERIC_FIELDS or field_types.get(name) == "NUMERIC":
+            column = pd.to_numeric(column, errors="coerce")
+        elif field_types.get(name) == "TAG":
+            column = column.replace("", None).astype("category")
+        data[name] = column
+    return pd.DataFrame(data)
+
+
+def _rows_to_columns(rows: list, names: list[str]) -> dict[str, list]:
+    if all(len(row) == 2 * len(names) and row[::2] == names for row in rows):
+        # every document returned every field in LOAD order: slice columns directly
+        values = list(zip(*(row[1::2] for row in rows)))
+        return {name: list(column) for name, column in zip(names, values)}
+    columns: dict[str, list] = {name: [None] * len(rows) for name in names}
+    for i, row in enumerate(rows):
+        for name, value in zip(row[::2], row[1::2]):
+            columns.setdefault(name, [None] * len(rows))[i] = value
+    return columns
+
+
+def iter_search(
+    r,
+    index: str,
+    query: str,
+    return_fields: Optional[list[str]] = None,
+    page_size: int = PAGE_SIZE,
+    field_types: Optional[dict[str, str]] = None,
+    dialect: Optional[int] = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Stream every document matching query as typed DataFrame chunks.
+
+    Pages through the complete result set with FT.AGGREGATE ... WITHCURSOR, so
+    results are not capped at FT.SEARCH's default 10 hits (or MAXSEARCHRESULTS)
+    and only one page is held in memory at a time.
+
+    :param r: Redis client (decode_responses=True).
+    :param index: RediSearch index name.
+    :param query: RediSearch query, e.g. "@Battalion:{B09}".
+    :param return_fields: Fields to load, defaults to every FireEvent field.
+    :param page_size: Documents per cursor read.
+    :param field_types: Index field types, read from FT.INFO when not provided.
+    :param dialect: Query dialect, the server default when not provided.
+    :yield: One DataFrame per page, with the document key in "_doc_id".
+    """
+    require_search(r)
+    names = ["__key"] + list(return_fields or EVENT_FIELDS)
+    field_types = field_types if field_types is not None else index_field_types(r, index)
+    load = [f"@{name}" for name in names]
+    reply, cursor = r.execute_command(
+        "FT.AGGREGATE", index, query,
+        "LOAD", len(load), *load,
+        "WITHCURSOR", "COUNT", page_size,
+        *(["DIALECT", dialect] if dialect else []),
+    )
+    while True:
+        rows = reply[1:]
+        if rows:
+            columns = _rows_to_columns(rows, names)
+            columns["_doc_id"] = columns.pop("__key")
+            yield typed_columns(columns, field_types)
+        if not cursor:
+            return
+        reply, cursor = r.execute_command(
+            "FT.CURSOR", "READ", index, cursor, "COUNT", page_size
+        )
+
+
+def search_to_df(
+    r,
+    index: str,
+    query: str,
+    return_fields: Optional[list[str]] = None,
+    page_size: int = PAGE_SIZE,
+) -> pd.DataFrame:
+    """
+    Run query and collect every matching document in one typed DataFrame.
+    See iter_search for the parameters.
+    """
+    field_types = index_field_types(r, index)
+    chunks = list(iter_search(r, index, query, return_fields, page_size, field_types))
+    if not chunks:
+        return pd.DataFrame(columns=["_doc_id"] + list(return_fields or EVENT_FIELDS))
+    df = pd.concat(chunks, ignore_index=True)
+    # categories differ between pages, concat falls back to object columns
+    for name, field_type in field_types.items():
+        if field_type == "TAG" and name in df and df[name].dtype == "object":
+            df[name] = df[name].astype("category")
+    return df
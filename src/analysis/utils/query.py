@@ -0,0 +1,201 @@
+import re
+
+from datetime import date, datetime
+from typing import Iterator, Optional, Union
+
+import pandas as pd
+
+from src.analysis.utils.dataframe import EVENT_FIELDS, PAGE_SIZE, _rows_to_columns, typed_columns, iter_search
+from src.services.models.fire_event_index import EVENT_INDEX_SCHEMA, REDIS_EVENT_INDEX_ID
+from src.services.utils.redis_utils import require_search
+
+Number = Union[int, float, datetime, date]
+GEO_UNITS = ("m", "km", "mi", "ft")
+
+# characters RediSearch requires to be escaped inside tag values
+_TAG_SPECIAL = re.compile(r"([,.<>{}\[\]\"':;!@#$%^&*()\-+=~|/\\ ])")
+
+
+def escape_tag(value) -> str:
+    return _TAG_SPECIAL.sub(r"\\\1", str(value))
+
+
+def schema_types(schema) -> dict[str, tuple[str, bool]]:
+    """
+    Field name -> (type, sortable) of a redis-py index schema.
+    """
+    return {f.name: (f.args[0], "SORTABLE" in f.args_suffix) for f in schema}
+
+
+def to_number(value: Number) -> float:
+    """
+    Numeric form of a filter bound, datetimes as epoch seconds like store_as_hash.
+    """
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day).timestamp()
+    return value
+
+
+class EventQuery:
+    """
+    FT.SEARCH builder over REDIS_EVENT_INDEX_ID, validated against its schema.
+
+    Only the selected fields are returned (RETURN) and sorting uses SORTABLE fields.
+
+    example: B09 incidents in Excelsior since 2024 within 500 m of a point, newest first
+        EventQuery()
+            .tag("Battalion", "B09")
+            .tag("neighborhood_district", "Excelsior")
+            .range("Incident_Date", low=datetime(2024, 1, 1))
+            .near(-122.4194, 37.7749, 500, "m")
+            .select("Incident_Number", "Incident_Date")
+            .sort_by("Incident_Date", ascending=False)
+    """
+
+    def __init__(self, index: str = REDIS_EVENT_INDEX_ID, schema=EVENT_INDEX_SCHEMA):
+        self.index = index
+        self.fields = schema_types(schema)
+        self.filters: list[str] = []
+        # structured form of filters, e.g. ("tag", field, values), to evaluate them outside Redis
+        self.conditions: list[tuple] = []
+        self.projection: list[str] = []
+        self.sort: Optional[tuple[str, bool]] = None
+        self.max_results: Optional[int] = None
+
+    def _check(self, field: str, kind: str) -> None:
+        if field not in self.fields:
+            raise ValueError(f"{field} is not indexed in {self.index}, indexed fields: {list(self.fields)}")
+        if self.fields[field][0] != kind:
+            raise ValueError(f"{field} is a {self.fields[field][0]} field, not {kind}")
+
+    def tag(self, field: str, *values) -> "EventQuery":
+        """
+        Match any of values on a TAG field.
+        """
+        self._check(field, "TAG")
+        if not values:
+            raise ValueError(f"tag filter on {field} needs at least one value")
+        self.filters.append(f"@{field}:{{{' | '.join(escape_tag(v) for v in values)}}}")
+        self.conditions.append(("tag", field, tuple(str(v) for v in values)))
+        return self
+
+    def range(
+        self, field: str, low: Optional[Number] = None, high: Optional[Number] = None, inclusive: bool = True
+    ) -> "EventQuery":
+        """
+        Bound a NUMERIC field, None leaves that side open.
+        """
+        self._check(field, "NUMERIC")
+        exclusive = "" if inclusive else "("
+        low = None if low is None else to_number(low)
+        high = None if high is None else to_number(high)
+        self.conditions.append(("range", field, low, high, inclusive))
+        low = "-inf" if low is None else f"{exclusive}{low}"
+        high = "+inf" if high is None else f"{exclusive}{high}"
+        self.filters.append(f"@{field}:[{low} {high}]")
+        return self
+
+    def equals(self, field: str, value: Number) -> "EventQuery":
+        return self.range(field, value, value)
+
+    def near(
+        self, lon: float, lat: float, radius: float, unit: str = "m", field: str = "location"
+    ) -> "EventQuery":
+        """
+        Events within radius of (lon, lat) on a GEO field, unit is m, km, mi or ft.
+        """
+        self._check(field, "GEO")
+        if unit not in GEO_UNITS:
+            raise ValueError(f"Unknown distance unit {unit}, expected one of {GEO_UNITS}")
+        self.filters.append(f"@{field}:[{lon} {lat} {radius} {unit}]")
+        self.conditions.append(("near", field, lon, lat, radius, unit))
+        return self
+
+    def within_box(
+        self, min_lon: float, min_lat: float, max_lon: float, max_lat: float
+    ) -> "EventQuery":
+        """
+        Events inside a bounding box, as ranges on the longitude/latitude fields.
+        """
+        return self.range("longitude", min_lon, max_lon).range("latitude", min_lat, max_lat)
+
+    def select(self, *fields: str) -> "EventQuery":
+        unknown = [f for f in fields if f not in EVENT_FIELDS and f not in self.fields]
+        if unknown:
+            raise ValueError(f"Unknown fields: {unknown}")
+        self.projection = list(dict.fromkeys(self.projection + list(fields)))
+        return self
+
+    def sort_by(self, field: str, ascending: bool = True) -> "EventQuery":
+        if not self.fields.get(field, (None, False))[1]:
+            raise ValueError(f"{field} is not a SORTABLE field of {self.index}")
+        self.sort = (field, ascending)
+        return self
+
+    def limit(self, max_results: int) -> "EventQuery":
+        self.max_results = max_results
+        return self
+
+    def query_string(self) -> str:
+        return " ".join(self.filters) or "*"
+
+    def args(self, offset: int = 0, num: Optional[int] = None) -> list:
+        """
+        FT.SEARCH command, projections are mandatory.
+        """
+        if not self.projection:
+            raise ValueError("select() the fields to return")
+        args = ["FT.SEARCH", self.index, self.query_string()]
+        args += ["RETURN", len(self.projection), *self.projection]
+        if self.sort:
+            args += ["SORTBY", self.sort[0], "ASC" if self.sort[1] else "DESC"]
+        args += ["LIMIT", offset, num if num is not None else self.max_results or PAGE_SIZE]
+        args += ["DIALECT", 2]
+        return args
+
+    def iter_pages(self, r, page_size: int = PAGE_SIZE) -> Iterator[pd.DataFrame]:
+        """
+        Run the query, one typed DataFrame per page, document keys in "_doc_id".
+
+        Unbounded, unsorted queries read the result set once through an
+        FT.AGGREGATE cursor. Bounded or sorted ones page FT.SEARCH with LIMIT,
+        which runs the query again for every page.
+        """
+        require_search(r)
+        field_types = {name: kind for name, (kind, _) in self.fields.items()}
+        if self.max_results is None and self.sort is None:
+            if not self.projection:
+                raise ValueError("select() the fields to return")
+            yield from iter_search(r, self.index, self.query_string(), self.projection, page_size, field_types, dialect=2)
+            return
+        offset = 0
+        remaining = self.max_results
+        while remaining is None or remaining > 0:
+            num = page_size if remaining is None else min(page_size, remaining)
+            reply = r.execute_command(*self.args(offset, num))
+            total, documents = reply[0], reply[1:]
+            keys, rows = documents[::2], documents[1::2]
+            if keys:
+                columns = _rows_to_columns(rows, self.projection)
+                columns["_doc_id"] = list(keys)
+                yield typed_columns(columns, field_types)
+            offset += len(keys)
+            remaining = None if remaining is None else remaining - len(keys)
+            if not keys or offset >= total:
+                return
+
+    def execute(self, r, page_size: int = PAGE_SIZE) -> pd.DataFrame:
+        pages = list(self.iter_pages(r, page_size))
+        if not pages:
+            return pd.DataFrame(columns=self.projection + ["_doc_id"])
+        df = pd.concat(pages, ignore_index=True)
+        # categories differ between pages, concat falls back to object columns
+        for name in self.projection:
+            if self.fields.get(name, ("",))[0] == "TAG" and not isinstance(df[name].dtype, pd.CategoricalDtype):
+                df[name] = df[name].astype("category")
+        return df
+
+    def __repr__(self) -> str:
+        return f"EventQuery({self.query_string()!r}, return={self.projection}, sort={self.sort}, limit={self.max_results})"
@@ -0,0 +1,109 @@
+import math
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as ds
+
+from src.services.utils.cold_storage import COLD_STORAGE_PATH, PARTITION_COLUMN, partition_files
+from src.analysis.utils.query import EventQuery
+
+EARTH_RADIUS_M = 6371008.8
+METERS = {"m": 1.0, "km": 1000.0, "mi": 1609.344, "ft": 0.3048}
+
+
+def _timestamp(epoch: float) -> pd.Timestamp:
+    # same convention as typed_columns, which typed the rows when they were written
+    return pd.to_datetime(epoch, unit="s")
+
+
+def _bound(field: str, value: float):
+    return _timestamp(value) if field == PARTITION_COLUMN else value
+
+
+def _filter_expression(query: EventQuery):
+    """
+    pyarrow filter of the tag and range conditions, used for row group pruning.
+    """
+    expression = None
+    for condition in query.conditions:
+        if condition[0] == "tag":
+            _, field, values = condition
+            term = ds.field(field).isin(list(values))
+        elif condition[0] == "range":
+            _, field, low, high, inclusive = condition
+            term = None
+            if low is not None:
+                low = _bound(field, low)
+                term = ds.field(field) >= low if inclusive else ds.field(field) > low
+            if high is not None:
+                high = _bound(field, high)
+                upper = ds.field(field) <= high if inclusive else ds.field(field) < high
+                term = upper if term is None else term & upper
+            if term is None:
+                continue
+        else:
+            continue
+        expression = term if expression is None else expression & term
+    return expression
+
+
+def _within(df: pd.DataFrame, lon: float, lat: float, radius_m: float) -> pd.Series:
+    lon1, lat1 = np.radians(df["longitude"].astype(float)), np.radians(df["latitude"].astype(float))
+    lon2, lat2 = math.radians(lon), math.radians(lat)
+    a = np.sin((lat1 - lat2) / 2) ** 2 + np.cos(lat1) * math.cos(lat2) * np.sin((lon1 - lon2) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a)) <= radius_m
+
+
+def _date_span(query: EventQuery) -> tuple[Optional[datetime], Optional[datetime]]:
+    start = end = None
+    for condition in query.conditions:
+        if condition[0] == "range" and condition[1] == PARTITION_COLUMN:
+            _, _, low, high, _ = condition
+            if low is not None:
+                start = max(filter(None, [start, _timestamp(low)]))
+            if high is not None:
+                end = min(filter(None, [end, _timestamp(high)]))
+    return start, end
+
+
+def cold_query(query: EventQuery, root: str = COLD_STORAGE_PATH) -> pd.DataFrame:
+    """
+    Evaluate an EventQuery on the cold Parquet files, reading only the monthly
+    partitions of its Incident_Date range, the row groups its filters can match
+    and the selected columns.
+    """
+    columns = list(dict.fromkeys(query.projection + ["_doc_id"]))
+    start, end = _date_span(query)
+    files = partition_files(root, start, end)
+    if not files:
+        return pd.DataFrame(columns=columns)
+    near = [c for c in query.conditions if c[0] == "near"]
+    read = list(dict.fromkeys(columns + (["longitude", "latitude"] if near else [])))
+    dataset = ds.dataset(files, format="parquet")
+    read = [c for c in read if c in dataset.schema.names]
+    df = dataset.to_table(columns=read, filter=_filter_expression(query)).to_pandas()
+    for _, _, lon, lat, radius, unit in near:
+        df = df[_within(df, lon, lat, radius * METERS[unit])]
+    return df.reindex(columns=columns).reset_index(drop=True)
+
+
+def tiered_query(r, query: EventQuery, root: str = COLD_STORAGE_PATH) -> pd.DataFrame:
+    """
+    Run an EventQuery on Redis (hot) and on cold storage and merge the results.
+
+    A document found in both tiers (moved while a query runs, or an interrupted
+    move) is returned once, from Redis. Sorting and limit apply to the merged rows.
+    """
+    hot = query.execute(r)
+    cold = cold_query(query, root)
+    if cold.empty:
+        return hot
+    df = pd.concat([hot, cold], ignore_index=True) if len(hot) else cold
+    df = df.drop_duplicates(subset="_doc_id", keep="first")
+    if query.sort:
+        df = df.sort_values(query.sort[0], ascending=query.sort[1], kind="stable")
+    if query.max_results:
+        df = df.head(query.max_results)
+    return df.reset_index(drop=True)
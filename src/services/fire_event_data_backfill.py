@@ -0,0 +1,318 @@
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from src.services.utils.logger_utils import getLogger, hline
+from src.services.models.fire_event import compile_fire_event_parser, data_quality_analysis, fire_event_to_key
+from src.services.utils.csv_utils import open_binary, read_csv_header, from_csv_rows, complete_rows_end
+from src.services.utils.csv_index import is_index_file, load_csv_index
+from src.services.utils.redis_utils import get_redis_client, hash_mapping, reset_generations, HASH_TAGS
+from src.services.utils.kafka_utils import get_topic_high_watermarks, set_consumer_group_offsets
+from src.services.utils.dateutils import try_strptime
+from src.services.utils.sketch_utils import EventSketches
+from src.services.utils.existence_filter import invalidate_existence_filters
+from src.services.models.fire_event_index import (
+    REDIS_EVENT_KEY_PREFIX,
+    REDIS_GENERATION_KEY,
+    REDIS_EXISTENCE_EPOCH_KEY,
+    create_indexes,
+    fire_event_to_hash,
+)
+
+logger = getLogger(__file__)
+
+SERVICE_NAME = os.environ.get("SERVICE_NAME", "fire_event_data_backfill")
+
+CSV_FOLDER_PATH = os.environ.get("CSV_FOLDER_PATH", "/data/fire_events")
+BACKFILL_WORKERS = int(os.environ.get("BACKFILL_WORKERS", os.cpu_count() or 1))
+# bytes of CSV per task, plain files only (compressed files are read by a single worker)
+BACKFILL_CHUNK_SIZE = int(os.environ.get("BACKFILL_CHUNK_SIZE", 32 * 2**20))
+BACKFILL_PIPELINE_SIZE = int(os.environ.get("BACKFILL_PIPELINE_SIZE", 1000))
+# rows failing parsing or data quality, one NDJSON file per chunk
+BACKFILL_FAILURES_PATH = os.environ.get("BACKFILL_FAILURES_PATH", "backfill_failures")
+# same settings as the serving layer
+ON_DUPLICATE = os.environ.get("ON_DUPLICATE", "continue").lower()
+if ON_DUPLICATE not in "version,replace,continue,fail": raise ValueError(f"Unknown ON_DUPLICATE option: {ON_DUPLICATE}")
+SKETCHES = os.environ.get("SKETCHES", "True").lower() == "true"
+
+# the source state updated at the end, so it only streams rows appended after the backfill
+SOURCE_SERVICE_NAME = os.environ.get("SOURCE_SERVICE_NAME", "fire_event_source")
+SOURCE_DATE_FORMAT = os.environ.get("SOURCE_DATE_FORMAT", "%Y/%m/%d")
+SOURCE_DATETIME_FORMAT = os.environ.get("SOURCE_DATETIME_FORMAT", "%Y/%m/%d %H:%M:%S")
+EVENTS_SOURCE_TOPIC = os.getenv("EVENTS_SOURCE_TOPIC", "fire_event_source")
+EVENTS_SOURCE_TOPIC_CG = os.getenv("EVENTS_SOURCE_TOPIC_CG", "fire_event_data_quality_service")
+VALIDATED_EVENTS_TOPIC = os.getenv("VALIDATED_EVENTS_TOPIC", "validated-fire-events")
+VALIDATED_EVENTS_TOPIC_CG = os.getenv("VALIDATED_EVENTS_TOPIC_CG", "fire_event_data_serving")
+
+# HSET unless the key exists (ARGV[1] == "0"), atomic so concurrent chunks keep
+# the ON_DUPLICATE semantics of the serving layer
+_STORE_SCRIPT = """
+if ARGV[1] == "1" or redis.call("EXISTS", KEYS[1]) == 0 then
+    redis.call("HSET", KEYS[1], unpack(ARGV, 2))
+    return 1
+end
+return 0
+"""
+
+
+def source_file_key(file: str) -> str:
+    # same key as fire_event_source.redis_file_key
+    return f"{SOURCE_SERVICE_NAME}:file:{file}"
+
+
+def source_latest_event_timestamp_key() -> str:
+    return f"{SOURCE_SERVICE_NAME}:latest_event_timestamp"
+
+
+def split_chunks(file_path: str, chunk_size: int = BACKFILL_CHUNK_SIZE) -> list[tuple[int, int | None]]:
+    """
+    Split a CSV file into byte ranges starting on row boundaries.
+
+    The CSV index blocks are used when the index is fresh (exact row offsets),
+    otherwise ranges are cut at the newline following every chunk_size bytes.
+    Compressed files cannot be seeked and form a single range.
+
+    :return: List of (start, end) ranges, end None meaning the end of the file.
+    """
+    _, first_row = read_csv_header(file_path)
+    end = complete_rows_end(file_path)
+    if end is None:
+        return [(first_row, None)]
+    if end <= first_row:
+        return []
+
+    index = load_csv_index(file_path)
+    if index is not None:
+        chunks, start = [], first_row
+        for block in index["blocks"]:
+            block_end = block["end"] if block["end"] is not None else end
+            if block_end - start >= chunk_size:
+                chunks.append((start, block_end))
+                start = block_end
+        if start < end:
+            chunks.append((start, end))
+        return chunks
+
+    chunks, start = [], first_row
+    with open_binary(file_path) as stream:
+        while start < end:
+            cut = end
+            if start + chunk_size < end:
+                cut = stream.find(b"\n", start + chunk_size) + 1 or end
+            cut = min(cut, end)
+            chunks.append((start, cut))
+            start = cut
+    return chunks
+
+
+def load_chunk(file_path: str, start: int, end: int | None) -> dict:
+    """
+    Parse, validate and store the rows of a byte range of a CSV file.
+
+    Runs in a worker process: rows are parsed with the parser compiled for the
+    header, checked with data_quality_analysis and valid events are written in
+    pipelines of BACKFILL_PIPELINE_SIZE. Failed rows are appended to a NDJSON file.
+
+    :return: Chunk statistics.
+    """
+    header, _ = read_csv_header(file_path)
+    parse = compile_fire_event_parser(header)
+    rcli = get_redis_client()
+    store = rcli.register_script(_STORE_SCRIPT)
+    # loaded up front on every node, cluster pipelines do not reload it on NOSCRIPT
+    rcli.script_load(_STORE_SCRIPT)
+    sketches = EventSketches(rcli, prefix=f"{REDIS_EVENT_KEY_PREFIX}:sketch")
+    replace = "1" if ON_DUPLICATE == "replace" else "0"
+
+    stats = {"file": file_path, "start": start, "rows": 0, "written": 0, "duplicated": 0,
+             "failed": 0, "max_date": None, "failures": None}
+    failures = None
+    pending: list[tuple[str, dict, list[str]]] = []
+
+    def fail(values: list[str], **reason) -> None:
+        nonlocal failures
+        if failures is None:
+            os.makedirs(BACKFILL_FAILURES_PATH, exist_ok=True)
+            stats["failures"] = os.path.join(
+                BACKFILL_FAILURES_PATH, f"{os.path.basename(file_path)}.{start}.ndjson"
+            )
+            failures = open(stats["failures"], "w")
+        stats["failed"] += 1
+        failures.write(json.dumps({**dict(zip(header, values)), **reason}) + "\n")
+
+    def flush() -> None:
+        pipe = rcli.pipeline(transaction=False)
+        for key, mapping, _ in pending:
+            store(keys=[key], args=[replace, *(item for field in mapping.items() for item in field)], client=pipe)
+        for (key, _, values), written in zip(pending, pipe.execute()):
+            if written:
+                stats["written"] += 1
+            else:
+                stats["duplicated"] += 1
+                if ON_DUPLICATE == "fail":
+                    fail(values, error=f"Duplicated event detected {key}")
+        if SKETCHES:
+            sketches.flush()
+        pending.clear()
+
+    try:
+        for offset, values in from_csv_rows(file_path, start, end):
+            stats["rows"] += 1
+            if len(values) < len(header):
+                fail(values, error=f"malformed row at offset {offset}")
+                continue
+            try:
+                event = parse(values)
+                issues = data_quality_analysis(event)
+            except Exception as err:
+                fail(values, error=str(err))
+                continue
+            if issues:
+                fail(values, data_quality_issues=issues)
+                continue
+            key = f"{fire_event_to_key(event, REDIS_EVENT_KEY_PREFIX, hash_tag=HASH_TAGS)}:0"
+            pending.append((key, hash_mapping(fire_event_to_hash(event)), values))
+            if SKETCHES:
+                sketches.add(event)
+            if stats["max_date"] is None or event.Incident_Date > stats["max_date"]:
+                stats["max_date"] = event.Incident_Date
+            if len(pending) >= BACKFILL_PIPELINE_SIZE:
+                flush()
+        if pending:
+            flush()
+    finally:
+        if failures is not None:
+            failures.close()
+    return stats
+
+
+def csv_files(paths: list[str]) -> list[str]:
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            names = sorted(n for n in os.listdir(path) if not is_index_file(n))
+            files += [os.path.join(path, n) for n in names if os.path.isfile(os.path.join(path, n))]
+        else:
+            files.append(path)
+    return files
+
+
+def hand_over_to_streaming(loaded: dict[str, dict], offsets: dict[str, dict[int, int]]) -> None:
+    """
+    Record the backfill in the streaming state: the source resumes after the
+    loaded rows of every file (a last row without a trailing newline is left to
+    it) and the downstream consumer groups skip the
+    messages produced before the backfill started (their rows were loaded).
+    """
+    rcli = get_redis_client()
+    latest = None
+    for file_path, status in loaded.items():
+        # an unterminated last row is not loaded, the source reads it once the file settles
+        completed = status["end"] is None or status["end"] >= status["size"]
+        # resumed from the byte offset: IDs are not monotonic, rows appended
+        # later may have lower IDs than the loaded ones
+        rcli.set(source_file_key(file_path), json.dumps(
+            {"latest_row": 0, "completed": completed, "offset": status["end"], "size": status["size"]}
+        ))
+        if status["max_date"] and (latest is None or status["max_date"] > latest):
+            latest = status["max_date"]
+    if latest is not None:
+        current = rcli.get(source_latest_event_timestamp_key())
+        if current is None or latest > try_strptime(str(current), [SOURCE_DATETIME_FORMAT, SOURCE_DATE_FORMAT]):
+            rcli.set(source_latest_event_timestamp_key(), latest.strftime(SOURCE_DATE_FORMAT))
+    for (topic, group), watermarks in offsets.items():
+        if watermarks:
+            set_consumer_group_offsets(group, topic, watermarks)
+
+
+def backfill(paths: list[str], offsets: bool = True) -> dict:
+    """
+    Load CSV files straight into the serving layer, bypassing Kafka.
+
+    Stop the source, data quality and serving services first: the topic high
+    watermarks are read before the load, messages produced earlier are skipped
+    once streaming resumes.
+
+    :param paths: CSV files or folders.
+    :param offsets: Move the consumer groups and the source state so streaming
+        takes over after the loaded rows.
+    :return: Totals of the load.
+    """
+    if ON_DUPLICATE == "version":
+        raise ValueError("ON_DUPLICATE=version is not supported by the backfill, revisions depend on the event order.")
+    watermarks = {}
+    if offsets:
+        watermarks = {
+            (EVENTS_SOURCE_TOPIC, EVENTS_SOURCE_TOPIC_CG): get_topic_high_watermarks(EVENTS_SOURCE_TOPIC),
+            (VALIDATED_EVENTS_TOPIC, VALIDATED_EVENTS_TOPIC_CG): get_topic_high_watermarks(VALIDATED_EVENTS_TOPIC),
+        }
+        logger.info(f"Offsets at the start of the backfill: {watermarks}")
+    if SKETCHES:
+        EventSketches(get_redis_client(), prefix=f"{REDIS_EVENT_KEY_PREFIX}:sketch").ensure()
+
+    loaded: dict[str, dict] = {}
+    tasks = []
+    for file_path in csv_files(paths):
+        size = os.path.getsize(file_path)
+        chunks = split_chunks(file_path)
+        _, first_row = read_csv_header(file_path)
+        loaded[file_path] = {"size": size, "end": chunks[-1][1] if chunks else first_row,
+                             "chunks": len(chunks), "max_date": None}
+        tasks += [(file_path, start, end) for start, end in chunks]
+    logger.info(f"Backfilling {len(loaded)} files in {len(tasks)} chunks with {BACKFILL_WORKERS} workers.")
+
+    totals = {"rows": 0, "written": 0, "duplicated": 0, "failed": 0, "failed_chunks": 0}
+    start_time = time.time()
+    with ProcessPoolExecutor(max_workers=BACKFILL_WORKERS) as executor:
+        futures = {executor.submit(load_chunk, *task): task for task in tasks}
+        for done, future in enumerate(as_completed(futures), start=1):
+            file_path, start, _ = futures[future]
+            try:
+                stats = future.result()
+            except Exception as err:
+                # the file is not handed over, the source streams it as before
+                logger.error(f"Chunk {file_path}@{start} failed: {err}")
+                totals["failed_chunks"] += 1
+                loaded.pop(file_path, None)
+                continue
+            for name in ["rows", "written", "duplicated", "failed"]:
+                totals[name] += stats[name]
+            if stats["failures"]:
+                logger.warning(f"{stats['failed']} rows of {file_path}@{start} written to {stats['failures']}")
+            status = loaded.get(file_path)
+            if status is not None:
+                if stats["max_date"] and (status["max_date"] is None or stats["max_date"] > status["max_date"]):
+                    status["max_date"] = stats["max_date"]
+            elapsed = max(time.time() - start_time, 1e-9)
+            logger.info(f"{done}/{len(tasks)} chunks, {totals['rows']} rows ({totals['rows'] / elapsed:.0f} rows/s).")
+
+    # results cached before the load are incomplete
+    reset_generations(REDIS_GENERATION_KEY)
+    invalidate_existence_filters(get_redis_client(), REDIS_EXISTENCE_EPOCH_KEY)
+    create_indexes()
+    if offsets:
+        hand_over_to_streaming(loaded, watermarks)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load historical CSV files straight into the serving layer.")
+    parser.add_argument("paths", nargs="*", default=[CSV_FOLDER_PATH], help="CSV files or folders")
+    parser.add_argument("--no-offsets", action="store_true", help="do not hand over to streaming")
+    args = parser.parse_args()
+
+    start = time.time()
+    totals = backfill(args.paths, offsets=not args.no_offsets)
+    hline(char="*", header="Backfill Report")
+    for name, value in totals.items():
+        logger.info(f"{name.capitalize().replace('_', ' ')}: {value}")
+    logger.info(f"Elapsed: {time.time() - start:.1f}s")
+    hline(char="*")
+    return 1 if totals["failed_chunks"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
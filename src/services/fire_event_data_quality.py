@@ -7,8 +7,8 @@ from src.services.utils.dateutils import try_strptime, try_strftime
 from src.services.utils.logger_utils import getLogger, hline
 from src.services.models.fire_event import (
     FireEvent,
+    compile_fire_event_parser,
     data_quality_analysis,
-    parse_fire_event,
 )
 from src.services.utils.kafka_utils import (
     create_consumer_config,
@@ -21,6 +21,14 @@ from src.services.utils.kafka_utils import (
     reset_consumer_group_to_earliest,
     get_consumer_group_lag,
 )
+from src.services.utils.event_headers import (
+    event_headers,
+    read_headers,
+    supported_schema,
+    HEADER_ID,
+    VALID,
+    INVALID,
+)
 
 BATCH_SIZE = int(os.getenv("BATCH_SIZE", 1000))
 DATE_FORMAT = os.getenv("DATE_FORMAT", "%Y-%m-%dT%H:%M:%S.%fZ")
@@ -60,6 +68,8 @@ SERVICE_NAME = os.environ.get("SERVICE_NAME", "fire_event_data_quality_service")
 
 FLUSH_TIMEOUT = os.environ.get("FLUSH_TIMEOUT", 3)
 
+parse_event = compile_fire_event_parser()
+
 
 def main():
     logger = getLogger(__file__)
@@ -133,10 +143,24 @@ def main():
                 if message is None:
                     continue
                 message_key = message.key().decode("utf-8") if message.key() else None
-                message_value = message.value().decode("utf-8")
+                headers = read_headers(message)
 
                 hline(header=str(message_key), char="=", as_debug=True)
-                logger.debug(f"Received message {message_key}...")
+                logger.debug(f"Received message {message_key} (ID {headers.get(HEADER_ID, 'N/A')})...")
+
+                if not supported_schema(headers):
+                    # routed on the headers alone, a newer payload is not parsed
+                    messages_with_errors += 1
+                    logger.warning(f"Unsupported schema version of message {message_key}: {headers}")
+                    producer.produce(
+                        UNVALIDATED_EVENTS_TOPIC,
+                        key=message_key,
+                        value=message.value(),
+                        headers=message.headers(),
+                    )
+                    processed_messages += 1
+                    continue
+                message_value = message.value().decode("utf-8")
 
                 try:
                     logger.debug(f"Decoding message {message_key}...")
@@ -153,7 +177,7 @@ def main():
 
                 try:
                     logger.debug(f"Parsing event from message {message_key}...")
-                    event = parse_fire_event(event_dict)
+                    event = parse_event(event_dict)
                 except Exception as e:
                     messages_with_errors += 1
                     logger.error(f"Failed to create FireEvent from dict for message {message_key}: {e}")
@@ -173,6 +197,7 @@ def main():
                             VALIDATED_EVENTS_TOPIC,
                             key=message_key,
                             value=json.dumps(event_dict),
+                            headers=event_headers(event.ID, event.Incident_Date, VALID),
                         )
 
                         latest_successful_event = event
@@ -185,6 +210,7 @@ def main():
                             UNVALIDATED_EVENTS_TOPIC,
                             key=message_key,
                             value=json.dumps(event_dict),
+                            headers=event_headers(event.ID, event.Incident_Date, INVALID),
                         )
                 except Exception as e:
                     logger.error(f"Data quality analysis failed for event {message_key}: {e}")
@@ -193,6 +219,7 @@ def main():
                             UNVALIDATED_EVENTS_TOPIC,
                             key=message_key,
                             value=json.dumps(event_dict),
+                            headers=event_headers(event.ID, event.Incident_Date, INVALID),
                         )
                         continue
                     elif ON_FAILURE == "raise":
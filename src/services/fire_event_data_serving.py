@@ -2,38 +2,58 @@ import os
 import json
 import time
 import datetime
+import redis
 
 from typing import Optional
 from datetime import datetime
-from dataclasses import asdict
 
 from src.services.utils.logger_utils import getLogger, hline
-from src.services.models.fire_event import FireEvent, parse_fire_event, fire_event_to_key
+from src.services.models.fire_event import FireEvent, compile_fire_event_parser, fire_event_to_key
+from src.services.models.fire_event_index import (
+    REDIS_EVENT_KEY_PREFIX,
+    REDIS_GENERATION_KEY,
+    REDIS_CHANGE_FEED_KEY,
+    REDIS_EXISTENCE_EPOCH_KEY,
+    REDIS_EVENT_INDEX_ID,
+    EVENT_INDEX_SCHEMA,
+    create_indexes,
+    recreate_indexes,
+    fire_event_to_hash,
+)
 from src.services.utils.kafka_utils import (
     create_kafka_consumer,
     create_consumer_config,
     kafka_consumer_generator,
     reset_consumer_group_to_earliest,
+    commit_offsets,
+    rewind,
 )
 from src.services.utils.redis_utils import (
     get_redis_client,
-    TagField,
-    NumericField,
-    TextField,
-    create_index,
-    delete_index,
-    store_as_hash,
+    pool_stats,
+    HASH_TAGS,
+    hash_mapping,
     get_latest_revision,
     delete_keys,
+    bump_generations,
+    reset_generations,
+    day_partition,
+)
+from src.services.utils.sketch_utils import EventSketches
+from src.services.utils.existence_filter import ExistenceFilter
+from src.services.utils.change_feed import change_record, append_change, CREATE, REPLACE, VERSION
+from src.services.utils.event_headers import (
+    read_headers,
+    header_incident_date,
+    supported_schema,
+    HEADER_VALIDATION,
+    VALID,
 )
 
 logger = getLogger(__file__)
 
 SERVICE_NAME = os.environ.get("SERVICE_NAME", "fire_event_data_serving")
 
-REDIS_EVENT_KEY_PREFIX = f"fireevent"
-REDIS_EVENT_INDEX_ID = f"{os.environ.get("REDIS_EVENT_INDEX_ID","fireevent")}_idx"
-
 ON_FAILURE = os.environ.get("ON_FAILURE", "continue")
 ON_DUPLICATE = os.environ.get("ON_DUPLICATE", "continue").lower()
 if ON_DUPLICATE not in "version,replace,continue,fail": raise ValueError(f"Unknown ON_DUPLICATE option: {ON_DUPLICATE}")
@@ -45,69 +65,124 @@ BATCH_SIZE = int(os.environ.get("BATCH_SIZE", 100))
 MAIN_LOOP = os.environ.get("MAIN_LOOP", "True").lower() == "true"
 MAIN_LOOP_INTERVAL = int(os.environ.get("MAIN_LOOP_INTERVAL", 30))
 MAIN_LOOP_TIMEOUT = int(os.environ.get("MAIN_LOOP_TIMEOUT", 60))
+# batches consumed again while Redis is unreachable before the service gives up
+STORE_RETRIES = int(os.environ.get("STORE_RETRIES", 5))
+
+SKETCHES = os.environ.get("SKETCHES", "True").lower() == "true"
+EXISTENCE_FILTER = os.environ.get("EXISTENCE_FILTER", "True").lower() == "true"
+CHANGE_FEED = os.environ.get("CHANGE_FEED", "True").lower() == "true"
 
 RESTART = os.environ.get("RESTART", "False").lower() == "true"
 
 VALIDATED_EVENTS_TOPIC = os.getenv("VALIDATED_EVENTS_TOPIC", "validated-fire-events")
 VALIDATED_EVENTS_TOPIC_CG = os.getenv("VALIDATED_EVENTS_TOPIC_CG", SERVICE_NAME)
 rcli = get_redis_client()
+parse_event = compile_fire_event_parser()
+# kept under the event prefix so RESTART clears them with the events
+sketches = EventSketches(rcli, prefix=f"{REDIS_EVENT_KEY_PREFIX}:sketch")
+# answers most {key}:0 existence checks without a round trip
+existence = ExistenceFilter(rcli, pattern=f"{REDIS_EVENT_KEY_PREFIX}:*:0", epoch_key=REDIS_EXISTENCE_EPOCH_KEY)
 
-def create_indexes():
+
+class DuplicatedEventsError(ValueError):
     """
-        create all required indexes for the serving layer
+    Raised by ON_DUPLICATE=fail once the batch is written: consuming it again would fail the same way.
     """
-    schema = [
-        TagField("Incident_Number"),  # Grouping/filtering by incident number
-        TagField("neighborhood_district"),  # District as tag field
-        TagField("Battalion"),  # Battalion as tag field
-        NumericField("ID", sortable=True),  # Row ID as numeric, sortable
-        NumericField("Alarm_DtTm", sortable=True),  # ISO date-time string, sortable
-        NumericField("Incident_Date", sortable=True),  # ISO date-time string, sortable
-    ]
-    create_index(REDIS_EVENT_INDEX_ID, schema, prefixes=[f"{REDIS_EVENT_KEY_PREFIX}"])
-
-
-def recreate_indexes():
-    delete_index(REDIS_EVENT_INDEX_ID)
-    create_indexes()
 
-def store_fire_event(event: FireEvent) -> None:
+
+def store_fire_events(events: list[FireEvent]) -> dict[str, FireEvent]:
     """
-    Stores a FireEvent dataclass instance in Redis as a hash.
-    Uses the key pattern: fireevent:{ID}
-    Serializes datetime fields as ISO strings.
+    Stores a micro-batch of FireEvents in Redis as hashes, coalesced per key.
+
+    Events sharing a key (fireevent:{Incident_Number}, hash-tagged with
+    REDIS_HASH_TAGS) are reduced to the net
+    result ON_DUPLICATE would leave once the whole batch is applied, so a bursty
+    incident costs one write instead of one per event:
+    - replace: the last event is written to {key}:0
+    - continue: the first event is written to {key}:0 unless it exists
+    - fail: as continue, then raises DuplicatedEventsError listing the duplicated keys
+    - version: every event is written as a new revision, in arrival order
+
+    Existence checks go through the local existence filter (EXISTENCE_FILTER),
+    the uncertain ones and the writes are sent in one pipeline each, the writes
+    with their change records (CHANGE_FEED), then the generations of the
+    written days are bumped.
+    :return: The written keys and their events.
     """
-    r_event_key: str = fire_event_to_key(event, REDIS_EVENT_KEY_PREFIX)
-
-    if bool(rcli.exists(f"{r_event_key}:0")):
-        # version,replace,continue,fail
-        if ON_DUPLICATE == "fail":
-            raise ValueError(f"Duplicated event detected {r_event_key}:0")
-        elif ON_DUPLICATE == "continue":
-            logger.debug(f"skipping {r_event_key}:0")
-            return None
-        elif ON_DUPLICATE in ["replace", "version"]:
-            if ON_DUPLICATE == "replace":
-                _k = f"{r_event_key}:0"
-                logger.debug(f"Overriding event {_k}")
-            elif ON_DUPLICATE == "version":
-                latest_revision = get_latest_revision(r_event_key)
-                _k = f"{r_event_key}:{latest_revision+1}"
-                logger.debug(f"Creating a new version {_k}")
-
-            store_as_hash(_k, asdict(event))
-        else:
-            return logger.warning(f"Impossible to parse {ON_DUPLICATE} to ON_DUPLICATE.")
+    grouped: dict[str, list[tuple[FireEvent, dict]]] = {}
+    for event in events:
+        # an event without a key or a hash is skipped alone, not with its batch
+        try:
+            r_event_key = fire_event_to_key(event, REDIS_EVENT_KEY_PREFIX, hash_tag=HASH_TAGS)
+            mapping = hash_mapping(fire_event_to_hash(event))
+        except ValueError as err:
+            if ON_FAILURE.lower() == "raise":
+                raise err
+            logger.warning(f"skipping event {event.ID}: {err}")
+            continue
+        grouped.setdefault(r_event_key, []).append((event, mapping))
+
+    pipe = rcli.pipeline(transaction=False)
+    if EXISTENCE_FILTER:
+        known = existence.exists([f"{r_event_key}:0" for r_event_key in grouped])
+        existing = {r_event_key: known[f"{r_event_key}:0"] for r_event_key in grouped}
     else:
-        _k = f"{r_event_key}:0"
-        logger.debug(f"persisting: {_k}")
-        return store_as_hash(_k, asdict(event))
+        for r_event_key in grouped:
+            pipe.exists(f"{r_event_key}:0")
+        existing = dict(zip(grouped, pipe.execute()))
+
+    writes: dict[str, FireEvent] = {}
+    mappings: dict[str, dict] = {}
+    changes = []
+    duplicated = []
+    for r_event_key, group in grouped.items():
+        exists = bool(existing[r_event_key])
+        if ON_DUPLICATE == "replace":
+            event, mappings[f"{r_event_key}:0"] = group[-1]
+            writes[f"{r_event_key}:0"] = event
+            changes.append((r_event_key, 0, REPLACE if exists else CREATE, event))
+        elif ON_DUPLICATE == "version":
+            first_revision = get_latest_revision(r_event_key) + 1 if exists else 0
+            for revision, (event, mapping) in enumerate(group, start=first_revision):
+                writes[f"{r_event_key}:{revision}"] = event
+                mappings[f"{r_event_key}:{revision}"] = mapping
+                changes.append((r_event_key, revision, VERSION if revision else CREATE, event))
+        else:
+            if not exists:
+                event, mappings[f"{r_event_key}:0"] = group[0]
+                writes[f"{r_event_key}:0"] = event
+                changes.append((r_event_key, 0, CREATE, event))
+            if exists or len(group) > 1:
+                duplicated.append(f"{r_event_key}:0")
+                logger.debug(f"skipping {len(group) - (not exists)} events of {r_event_key}:0")
+
+    for _k, mapping in mappings.items():
+        pipe.hset(_k, mapping=mapping)
+    if CHANGE_FEED:
+        for r_event_key, revision, operation, event in changes:
+            record = change_record(r_event_key, revision, operation, event.Incident_Date, event.Battalion)
+            append_change(pipe, REDIS_CHANGE_FEED_KEY, record)
+    pipe.execute()
+    logger.debug(f"{len(events)} events coalesced into {len(writes)} writes")
+    if EXISTENCE_FILTER:
+        # every grouped key has a revision 0 now, written or already there
+        existence.add(f"{r_event_key}:0" for r_event_key in grouped)
+    if writes:
+        # cached query results of the written days are stale
+        bump_generations(
+            REDIS_GENERATION_KEY, {day_partition(e.Incident_Date) for e in writes.values() if e.Incident_Date}
+        )
+
+    if duplicated and ON_DUPLICATE == "fail":
+        raise DuplicatedEventsError(f"Duplicated events detected {duplicated}")
+    return writes
 
 
 def main():
     if RESTART:
         recreate_indexes()
-        delete_keys(REDIS_EVENT_KEY_PREFIX)
+        delete_keys(f"{REDIS_EVENT_KEY_PREFIX}:*")
+        reset_generations(REDIS_GENERATION_KEY)
         reset_consumer_group_to_earliest(
             topic=VALIDATED_EVENTS_TOPIC, group_id=VALIDATED_EVENTS_TOPIC_CG
         )
@@ -117,16 +192,31 @@ def main():
         hline()
         return 
     create_indexes()
-    kc = create_kafka_consumer(create_consumer_config(consumer_group=VALIDATED_EVENTS_TOPIC_CG), [VALIDATED_EVENTS_TOPIC])
+    if SKETCHES:
+        sketches.ensure()
+    consumer_config = create_consumer_config(consumer_group=VALIDATED_EVENTS_TOPIC_CG)
+    # events are written at the end of the batch, offsets are committed after them
+    consumer_config["enable.auto.commit"] = False
+    kc = create_kafka_consumer(consumer_config, [])
+    # partitions moved from another replica bring keys this filter has not seen
+    kc.subscribe([VALIDATED_EVENTS_TOPIC], on_assign=lambda consumer, partitions: existence.invalidate())
     logger.info(f"{SERVICE_NAME} is started.")
+    store_failures = 0
     while True:
         processed_messages = 0  
         messages_with_errors = 0
         sucessful_messages = 0
+        skipped_messages = 0
         latest_successful_event = None
         latest_incident_time = None
         latest_sucessful_incident_time = None
         start_time = time.time()
+        events: list[FireEvent] = []
+        written = {}
+        # {(topic, partition): offset} of the first message of the batch and after the last processed one
+        first_offsets: dict[tuple[str, int], int] = {}
+        positions: dict[tuple[str, int], int] = {}
+        stored, retry = True, False
 
         def stop():
             end_time = time.time()
@@ -137,18 +227,30 @@ def main():
             return processed_messages >= BATCH_SIZE or timeout
 
         try:
+            # stop() is checked before every poll, a polled message is always processed
             for msg in kafka_consumer_generator(kc, checkInterruption=stop):
-                if stop():
-                    break
+                partition = (msg.topic(), msg.partition())
+                first_offsets.setdefault(partition, msg.offset())
+                positions[partition] = msg.offset() + 1
                 key_str = msg.key().decode("utf-8")
                 hline(header=key_str, as_debug=True)
                 processed_messages+=1
+                headers = read_headers(msg)
+                if headers:
+                    latest_incident_time = header_incident_date(headers)
+                    # events that would not be stored are never deserialized
+                    if headers.get(HEADER_VALIDATION) != VALID or not supported_schema(headers) or latest_incident_time is None:
+                        skipped_messages += 1
+                        logger.debug(f"skipping {key_str} on its headers {headers}")
+                        continue
                 data_str = msg.value().decode("utf-8")
                 data = json.loads(data_str)
-                event: FireEvent = parse_fire_event(data)
+                event: FireEvent = parse_event(data)
                 latest_incident_time = event.Incident_Date
 
-                store_fire_event(event)
+                events.append(event)
+                if SKETCHES:
+                    sketches.add(event)
 
                 latest_successful_event = key_str
                 sucessful_messages +=1
@@ -158,10 +260,46 @@ def main():
             messages_with_errors+=1
             if ON_FAILURE.lower() == "raise":
                 raise err
+        try:
+            written = store_fire_events(events)
+        except DuplicatedEventsError as err:
+            messages_with_errors+=1
+            if ON_FAILURE.lower() == "raise":
+                raise err
+            logger.warning(str(err))
+        except (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError) as err:
+            # Redis is unreachable (after the client retries): the batch is consumed again
+            stored, retry = False, True
+            store_failures += 1
+            messages_with_errors+=1
+            logger.error(f"Batch of {len(events)} events not stored ({store_failures}/{STORE_RETRIES}): {err}")
+            if ON_FAILURE.lower() == "raise" or store_failures > STORE_RETRIES:
+                # offsets are not committed, the batch is consumed again once restarted
+                raise err
+        except Exception as err:
+            stored = False
+            messages_with_errors+=1
+            logger.error(f"Batch of {len(events)} events skipped: {err}")
+            if ON_FAILURE.lower() == "raise":
+                raise err
+        if SKETCHES:
+            sketches.flush() if stored else sketches.discard()
+        if retry:
+            rewind(kc, first_offsets)
+            time.sleep(MAIN_LOOP_INTERVAL)
+        else:
+            # stored or skipped, as a batch failing for its content would fail again
+            store_failures = 0
+            commit_offsets(kc, positions)
         hline(char="*", header="Process Report")
         logger.info(f"Processed messages: {processed_messages}")
         logger.info(f"Sucessfull messages: {sucessful_messages}")
         logger.info(f"Messages with errors: {messages_with_errors}")
+        logger.info(f"Skipped on headers: {skipped_messages}")
+        logger.info(f"Coalesced writes: {len(written)}")
+        if EXISTENCE_FILTER:
+            logger.info(f"Existence filter: {existence.stats}, hit ratio {existence.hit_ratio():.1%}")
+        logger.info(f"Redis pool: {pool_stats(rcli)}")
         logger.info(f"Latest sucessfull event: {latest_successful_event}")
         logger.info(f"Latest incident time: {latest_incident_time}")
         logger.info(f"Latest sucessfull incident time: {latest_sucessful_incident_time}")
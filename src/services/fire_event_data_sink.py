@@ -0,0 +1,119 @@
+import os
+import json
+import time
+from dataclasses import asdict, fields
+
+import pandas as pd
+import pyarrow as pa
+
+from src.services.utils.logger_utils import getLogger, hline
+from src.services.models.fire_event import FireEvent, compile_fire_event_parser
+from src.services.utils.cold_storage import write_partitions, compact_partitions
+from src.services.utils.kafka_utils import (
+    create_kafka_consumer,
+    create_consumer_config,
+    reset_consumer_group_to_earliest,
+)
+
+logger = getLogger(__file__)
+
+SERVICE_NAME = os.environ.get("SERVICE_NAME", "fire_event_data_sink")
+
+ON_FAILURE = os.environ.get("ON_FAILURE", "continue")
+PARQUET_SINK_PATH = os.environ.get("PARQUET_SINK_PATH", "/data/lake/fire_events")
+BATCH_SIZE = int(os.environ.get("BATCH_SIZE", 10000))
+MAIN_LOOP = os.environ.get("MAIN_LOOP", "True").lower() == "true"
+MAIN_LOOP_TIMEOUT = int(os.environ.get("MAIN_LOOP_TIMEOUT", 60))
+COMPACTION_INTERVAL = int(os.environ.get("COMPACTION_INTERVAL", 3600))
+COMPACTION_MIN_FILES = int(os.environ.get("COMPACTION_MIN_FILES", 8))
+
+RESTART = os.environ.get("RESTART", "False").lower() == "true"
+
+VALIDATED_EVENTS_TOPIC = os.getenv("VALIDATED_EVENTS_TOPIC", "validated-fire-events")
+VALIDATED_EVENTS_TOPIC_CG = os.getenv("VALIDATED_EVENTS_TOPIC_CG", SERVICE_NAME)
+
+parse_event = compile_fire_event_parser()
+
+# the Kafka coordinates identify a row, replayed messages are dropped by compaction.
+# RESTART recreates the topic and offsets start over at 0: the message timestamp
+# (epoch ms, kept by a replay) tells rows of different topic incarnations apart
+KAFKA_COLUMNS = ["_kafka_partition", "_kafka_offset", "_kafka_timestamp"]
+_ARROW_TYPES = {"str": pa.string(), "int": pa.int64(), "datetime": pa.timestamp("us")}
+SCHEMA = pa.schema(
+    [
+        (f.name, next(t for name, t in _ARROW_TYPES.items() if name in str(f.type)))
+        for f in fields(FireEvent)
+    ]
+    + [(column, pa.int64()) for column in KAFKA_COLUMNS]
+)
+
+
+def write_batch(events: list[dict]) -> None:
+    df = pd.DataFrame(events, columns=SCHEMA.names)
+    df["Incident_Date"] = pd.to_datetime(df["Incident_Date"])
+    for path, rows in write_partitions(df, PARQUET_SINK_PATH, schema=SCHEMA).items():
+        logger.debug(f"{rows} events written to {path}")
+
+
+def main():
+    if RESTART:
+        reset_consumer_group_to_earliest(topic=VALIDATED_EVENTS_TOPIC, group_id=VALIDATED_EVENTS_TOPIC_CG)
+        hline()
+        logger.info("RESTARTED")
+        hline()
+        return
+    config = create_consumer_config(consumer_group=VALIDATED_EVENTS_TOPIC_CG)
+    # offsets are committed once the batch is on disk
+    config["enable.auto.commit"] = False
+    kc = create_kafka_consumer(config, [VALIDATED_EVENTS_TOPIC])
+    logger.info(f"{SERVICE_NAME} is started, writing to {PARQUET_SINK_PATH}.")
+    last_compaction = time.time()
+    while True:
+        start_time = time.time()
+        events = []
+        messages_with_errors = 0
+        while len(events) + messages_with_errors < BATCH_SIZE and time.time() - start_time < MAIN_LOOP_TIMEOUT:
+            messages = kc.consume(num_messages=BATCH_SIZE - len(events) - messages_with_errors, timeout=1.0)
+            for msg in messages:
+                if msg.error():
+                    logger.error(f"Kafka error: {msg.error()}")
+                    continue
+                try:
+                    event = asdict(parse_event(json.loads(msg.value())))
+                except Exception as err:
+                    messages_with_errors += 1
+                    logger.warning(f"Event {msg.key()} not parsed: {err}")
+                    if ON_FAILURE.lower() == "raise":
+                        raise err
+                    continue
+                if event["Incident_Date"] is None:
+                    messages_with_errors += 1
+                    continue
+                event["_kafka_partition"], event["_kafka_offset"] = msg.partition(), msg.offset()
+                event["_kafka_timestamp"] = msg.timestamp()[1]
+                events.append(event)
+        if events:
+            write_batch(events)
+        if events or messages_with_errors:
+            kc.commit(asynchronous=False)
+
+        compacted = 0
+        if time.time() - last_compaction >= COMPACTION_INTERVAL:
+            compacted = compact_partitions(
+                PARQUET_SINK_PATH, min_files=COMPACTION_MIN_FILES, unique=KAFKA_COLUMNS
+            )
+            last_compaction = time.time()
+
+        hline(char="*", header="Process Report")
+        logger.info(f"Written events: {len(events)}")
+        logger.info(f"Messages with errors: {messages_with_errors}")
+        logger.info(f"Compacted partitions: {compacted}")
+        logger.info(f"Elapsed: {time.time() - start_time:.1f}s")
+        hline(char="*")
+
+        if not MAIN_LOOP:
+            break
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+import os
+import io
+import sys
+import json
+import time
+import struct
+import argparse
+from datetime import datetime
+
+import zstandard
+
+from src.services.utils.logger_utils import getLogger, hline
+from src.services.utils.redis_utils import get_redis_client, delete_keys, reset_generations
+from src.services.utils.kafka_utils import get_consumer_group_offsets, set_consumer_group_offsets
+from src.services.utils.existence_filter import invalidate_existence_filters
+from src.services.models.fire_event_index import create_indexes, REDIS_GENERATION_KEY, REDIS_EXISTENCE_EPOCH_KEY
+
+logger = getLogger(__file__)
+
+SNAPSHOT_PATTERNS = os.environ.get("SNAPSHOT_PATTERNS", "fireevent:*").split(",")
+SNAPSHOT_SCAN_COUNT = int(os.environ.get("SNAPSHOT_SCAN_COUNT", 10000))
+SNAPSHOT_BATCH_SIZE = int(os.environ.get("SNAPSHOT_BATCH_SIZE", 1000))
+SNAPSHOT_COMPRESSION_LEVEL = int(os.environ.get("SNAPSHOT_COMPRESSION_LEVEL", 3))
+SNAPSHOT_PROGRESS_INTERVAL = float(os.environ.get("SNAPSHOT_PROGRESS_INTERVAL", 5))
+
+VALIDATED_EVENTS_TOPIC = os.getenv("VALIDATED_EVENTS_TOPIC", "validated-fire-events")
+VALIDATED_EVENTS_TOPIC_CG = os.getenv("VALIDATED_EVENTS_TOPIC_CG", "fire_event_data_serving")
+
+MAGIC = b"FESNAP1\n"
+# key length, ttl in ms (0 for none), payload length; a zero key length ends the file
+_RECORD = struct.Struct(">IqI")
+_HEADER_LENGTH = struct.Struct(">I")
+
+
+class _Progress:
+    def __init__(self, action: str):
+        self.action = action
+        self.start = self.last = time.time()
+        self.keys = 0
+        self.bytes = 0
+
+    def add(self, keys: int, size: int) -> None:
+        self.keys += keys
+        self.bytes += size
+        if time.time() - self.last >= SNAPSHOT_PROGRESS_INTERVAL:
+            self.last = time.time()
+            self.log()
+
+    def log(self) -> None:
+        elapsed = max(time.time() - self.start, 1e-9)
+        logger.info(
+            f"{self.action} {self.keys} keys, {self.bytes / 2**20:.1f} MiB "
+            f"({self.keys / elapsed:.0f} keys/s)."
+        )
+
+
+def _read_exactly(stream, size: int) -> bytes:
+    data = stream.read(size)
+    if len(data) != size:
+        raise EOFError("Truncated snapshot")
+    return data
+
+
+def snapshot(path: str, patterns: list[str] = SNAPSHOT_PATTERNS, offsets: bool = True) -> int:
+    """
+    Stream the keys matching patterns (event hashes, sketches, counters, ...)
+    with their DUMP payloads and the serving consumer group offsets into a
+    zstd-compressed file.
+
+    Offsets are read before the keys, so a restore replays at most the events
+    consumed while the snapshot ran. Stop the serving layer first when
+    ON_DUPLICATE=version must not create extra revisions.
+
+    :return: Number of keys written.
+    """
+    r = get_redis_client(decode_responses=False)
+    header = {
+        "created": datetime.now().isoformat(),
+        "patterns": patterns,
+        "topic": VALIDATED_EVENTS_TOPIC,
+        "group": VALIDATED_EVENTS_TOPIC_CG,
+        "offsets": get_consumer_group_offsets(VALIDATED_EVENTS_TOPIC_CG, VALIDATED_EVENTS_TOPIC) if offsets else {},
+    }
+    logger.info(f"Snapshot of {patterns} to {path}, offsets: {header['offsets']}")
+    progress = _Progress("Saved")
+    with open(f"{path}.tmp", "wb") as file:
+        file.write(MAGIC)
+        with zstandard.ZstdCompressor(level=SNAPSHOT_COMPRESSION_LEVEL).stream_writer(file, closefd=False) as out:
+            encoded = json.dumps(header).encode()
+            out.write(_HEADER_LENGTH.pack(len(encoded)) + encoded)
+
+            def write_batch(keys: list[bytes]) -> None:
+                pipe = r.pipeline(transaction=False)
+                for key in keys:
+                    pipe.dump(key)
+                    pipe.pttl(key)
+                replies = pipe.execute()
+                size = 0
+                for key, payload, ttl in zip(keys, replies[::2], replies[1::2]):
+                    if payload is None:  # deleted since scanned
+                        continue
+                    out.write(_RECORD.pack(len(key), max(ttl, 0), len(payload)) + key + payload)
+                    size += len(key) + len(payload)
+                progress.add(len(keys), size)
+
+            for pattern in patterns:
+                batch = []
+                for key in r.scan_iter(match=pattern, count=SNAPSHOT_SCAN_COUNT):
+                    batch.append(key)
+                    if len(batch) >= SNAPSHOT_BATCH_SIZE:
+                        write_batch(batch)
+                        batch = []
+                if batch:
+                    write_batch(batch)
+            out.write(_RECORD.pack(0, 0, 0))
+    os.replace(f"{path}.tmp", path)
+    progress.log()
+    return progress.keys
+
+
+def restore(path: str, replace: bool = True, offsets: bool = True) -> int:
+    """
+    Bulk-load a snapshot with pipelined RESTOREs, create the indexes and move
+    the serving consumer group to the recorded offsets, so serving resumes
+    where the snapshot was taken.
+
+    :param replace: Delete the keys matching the snapshot patterns first, so
+        Redis holds exactly the snapshot.
+    :param offsets: Restore the consumer group offsets (the group must be inactive).
+    :return: Number of restored keys.
+    """
+    r = get_redis_client(decode_responses=False)
+    progress = _Progress("Restored")
+    with open(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a serving snapshot")
+        stream = io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(file))
+        (length,) = _HEADER_LENGTH.unpack(_read_exactly(stream, _HEADER_LENGTH.size))
+        header = json.loads(_read_exactly(stream, length))
+        logger.info(f"Restoring snapshot of {header['created']} ({header['patterns']}).")
+        if replace:
+            for pattern in header["patterns"]:
+                delete_keys(pattern)
+        create_indexes()
+
+        pipe = r.pipeline(transaction=False)
+        pending = size = 0
+        while True:
+            key_length, ttl, payload_length = _RECORD.unpack(_read_exactly(stream, _RECORD.size))
+            if key_length == 0:
+                break
+            key = _read_exactly(stream, key_length)
+            payload = _read_exactly(stream, payload_length)
+            pipe.restore(key, ttl, payload, replace=True)
+            pending += 1
+            size += key_length + payload_length
+            if pending >= SNAPSHOT_BATCH_SIZE:
+                pipe.execute()
+                progress.add(pending, size)
+                pending = size = 0
+        if pending:
+            pipe.execute()
+            progress.add(pending, size)
+    progress.log()
+    # results cached before the restore must not be served
+    reset_generations(REDIS_GENERATION_KEY)
+    invalidate_existence_filters(get_redis_client(), REDIS_EXISTENCE_EPOCH_KEY)
+
+    if offsets and header["offsets"]:
+        set_consumer_group_offsets(header["group"], header["topic"], header["offsets"])
+    return progress.keys
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Snapshot or restore the serving layer state.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    save = commands.add_parser("snapshot")
+    save.add_argument("path")
+    save.add_argument("--no-offsets", action="store_true", help="do not record consumer offsets")
+    load = commands.add_parser("restore")
+    load.add_argument("path")
+    load.add_argument("--keep-existing", action="store_true", help="do not delete keys first")
+    load.add_argument("--no-offsets", action="store_true", help="do not move consumer offsets")
+    args = parser.parse_args()
+
+    start = time.time()
+    if args.command == "snapshot":
+        keys = snapshot(args.path, offsets=not args.no_offsets)
+    else:
+        keys = restore(args.path, replace=not args.keep_existing, offsets=not args.no_offsets)
+    hline()
+    logger.info(f"{args.command}: {keys} keys in {time.time() - start:.1f}s")
+    hline()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+import os
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from src.services.utils.logger_utils import getLogger, hline
+from src.services.models.fire_event import parse_point
+from src.services.utils.redis_utils import get_redis_client, bump_generations, day_partition
+from src.services.utils.cold_storage import COLD_STORAGE_PATH, write_partitions
+from src.services.utils.existence_filter import invalidate_existence_filters
+from src.services.models.fire_event_index import REDIS_EVENT_INDEX_ID, REDIS_GENERATION_KEY, REDIS_EXISTENCE_EPOCH_KEY
+from src.analysis.utils.dataframe import iter_search
+
+logger = getLogger(__file__)
+
+SERVICE_NAME = os.environ.get("SERVICE_NAME", "fire_event_data_tiering")
+
+# events with an Incident_Date older than the horizon leave Redis
+TIERING_HORIZON_DAYS = int(os.environ.get("TIERING_HORIZON_DAYS", 365))
+# rows buffered before writing part files and deleting their keys
+TIERING_FILE_ROWS = int(os.environ.get("TIERING_FILE_ROWS", 100000))
+TIERING_DELETE_BATCH_SIZE = int(os.environ.get("TIERING_DELETE_BATCH_SIZE", 1000))
+MAIN_LOOP = os.environ.get("MAIN_LOOP", "True").lower() == "true"
+MAIN_LOOP_INTERVAL = int(os.environ.get("MAIN_LOOP_INTERVAL", 3600))
+
+rcli = get_redis_client()
+
+
+def with_location(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add the location fields the serving layer derives from point (see fire_event_to_hash).
+    """
+    points = [parse_point(p) if isinstance(p, str) else None for p in df["point"]]
+    df["longitude"] = [p[0] if p else None for p in points]
+    df["latitude"] = [p[1] if p else None for p in points]
+    df["location"] = [f"{p[0]},{p[1]}" if p else None for p in points]
+    return df
+
+
+def evict(chunks: list[pd.DataFrame]) -> int:
+    """
+    Write buffered events to cold storage, then delete them from Redis.
+    """
+    df = with_location(pd.concat(chunks, ignore_index=True))
+    for path, rows in write_partitions(df, COLD_STORAGE_PATH).items():
+        logger.info(f"{rows} events written to {path}")
+    keys = df["_doc_id"].tolist()
+    for i in range(0, len(keys), TIERING_DELETE_BATCH_SIZE):
+        rcli.unlink(*keys[i : i + TIERING_DELETE_BATCH_SIZE])
+    # serving must not skip events of these keys as duplicates
+    invalidate_existence_filters(rcli, REDIS_EXISTENCE_EPOCH_KEY)
+    # cached hot query results of these days are no longer complete
+    bump_generations(REDIS_GENERATION_KEY, {day_partition(d) for d in df["Incident_Date"].dropna()})
+    return len(df)
+
+
+def move_cold_events(horizon: datetime) -> int:
+    """
+    Move the events older than horizon from Redis to monthly Parquet files.
+    :return: Number of moved events.
+    """
+    query = f"@Incident_Date:[-inf ({horizon.timestamp()}]"
+    logger.info(f"Moving events before {horizon} to {COLD_STORAGE_PATH}: {query}")
+    moved = 0
+    buffered: list[pd.DataFrame] = []
+    buffered_rows = 0
+    # keys are deleted only after their rows are safely on disk
+    for page in iter_search(rcli, REDIS_EVENT_INDEX_ID, query):
+        buffered.append(page)
+        buffered_rows += len(page)
+        if buffered_rows >= TIERING_FILE_ROWS:
+            moved += evict(buffered)
+            buffered, buffered_rows = [], 0
+    if buffered:
+        moved += evict(buffered)
+    return moved
+
+
+def main():
+    logger.info(f"{SERVICE_NAME} is started.")
+    while True:
+        start_time = time.time()
+        horizon = datetime.combine(datetime.now().date() - timedelta(days=TIERING_HORIZON_DAYS), datetime.min.time())
+        moved = move_cold_events(horizon)
+        hline(char="*", header="Tiering Report")
+        logger.info(f"Horizon: {horizon}")
+        logger.info(f"Moved events: {moved}")
+        logger.info(f"Elapsed: {time.time() - start_time:.1f}s")
+        hline(char="*")
+
+        if not MAIN_LOOP:
+            break
+        time.sleep(MAIN_LOOP_INTERVAL)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,10 +6,13 @@ import asyncio
 
 from datetime import datetime
 from src.services.utils.logger_utils import getLogger, hline
-from src.services.utils.csv_utils import from_csv_generator
+from src.services.utils.csv_utils import from_csv_rows, read_csv_header, complete_rows_end
+from src.services.utils.csv_index import from_indexed_csv_rows, is_index_file, load_csv_index
+from src.services.utils.file_watcher import DirectoryWatcher
 from src.services.utils.redis_utils import get_redis_client, redis, delete_keys
 from src.services.utils.kafka_utils import create_kafka_producer, create_producer_config, create_kafka_topic_if_not_exists, delete_kafka_topic
 from src.services.utils.dateutils import try_strptime
+from src.services.utils.event_headers import event_headers, read_headers, header_incident_date, HEADER_ID, RAW
 from confluent_kafka import Producer
 
 from typing import Optional
@@ -25,6 +28,7 @@ CSV_FOLDER_PATH = os.environ.get("CSV_FOLDER_PATH", "/data/fire_events")
 FIRE_EVENT_SOURCE_TOPIC = os.environ.get("FIRE_EVENT_SOURCE_TOPIC", "fire_event_source")
 SERVICE_NAME = os.environ.get("SERVICE_NAME", "fire_event_source")
 RESTART = os.environ.get("RESTART", "False").lower() == "true"
+CSV_INDEX = os.environ.get("CSV_INDEX", "True").lower() == "true"
 REDIS_LAST_EVENT_TIMESTAMP_KEY = os.environ.get("REDIS_LATEST_EVENT_TIMESTAMP", f"{SERVICE_NAME}:latest_event_timestamp")
 
 logger = getLogger(__file__)
@@ -41,6 +45,26 @@ def redis_file_key(file: str):
     return f"{SERVICE_NAME}:file:{file}"
 
 
+def settled_end(file_path: str, size: int, end: Optional[int], unsettled: dict[str, tuple[int, float]]) -> Optional[int]:
+    """
+    Offset up to which a file can be read. A last row without a trailing newline
+    may still be being written: it is read once the file size has not changed
+    for MAIN_LOOP_INTERVAL seconds (or right away in a single pass, MAIN_LOOP=False).
+    :param end: complete_rows_end of the file, None for compressed files.
+    :param unsettled: Files ending with an unterminated row, path -> (size, time that size was first seen).
+    """
+    if end is None or end >= size:
+        unsettled.pop(file_path, None)
+        return end
+    seen_size, seen_at = unsettled.get(file_path, (None, 0.0))
+    if seen_size != size:
+        unsettled[file_path] = (size, time.time())
+    elif time.time() - seen_at >= MAIN_LOOP_INTERVAL:
+        unsettled.pop(file_path)
+        return size
+    return size if not MAIN_LOOP else end
+
+
 def main():
     global START_DATE
     logger.info("Starting fire event source...")
@@ -58,6 +82,7 @@ def main():
         f"\nCSV_FOLDER_PATH={CSV_FOLDER_PATH}, "
         f"\nSTART_DATE={START_DATE}, "
         f"\nRESTART={RESTART}, "
+        f"\nCSV_INDEX={CSV_INDEX}, "
         # f"\nlatest_event_timestamp={latest_event_timestamp}"
     )
     time.sleep(10)
@@ -74,8 +99,9 @@ def main():
                 logger.error(f"Message delivery failed: {err}")
             else:
                 logger.debug(f"Message {msg.key().decode('utf-8')} delivered to {msg.topic()} [{msg.partition()}] at offset {msg.offset()}")
-                row = json.loads(msg.value())
-                rkey = redis_row_key(row)  # Use the key from the message
+                # ID and Incident_Date travel in the headers, the payload is not parsed again
+                headers = read_headers(msg)
+                rkey = redis_row_key({"ID": headers[HEADER_ID]})
 
                 logger.debug(f"Setting control key in Redis: {rkey}")
                 rcli.set(rkey, json.dumps({"processed": True}))  # Store the message in Redis
@@ -90,25 +116,23 @@ def main():
                         latest_event_timestamp_str, [DATETIME_FORMAT, DATE_FORMAT]
                     )
 
-                incident_date_str = row.get("Incident Date", "")
-                incident_date = try_strptime(
-                    incident_date_str, [DATETIME_FORMAT, DATE_FORMAT]
-                )
+                incident_date = header_incident_date(headers)
                 if incident_date is None:
                     raise ValueError(
-                        f"Invalid incident date format for incident {row.get('Incident Number', 'N/A')}: {incident_date_str}"
-                    )                                                                
+                        f"Missing incident date for incident {msg.key().decode('utf-8')}"
+                    )
+                incident_date_str = incident_date.strftime(DATE_FORMAT)
                 # datetime.strptime(
                 #     incident_date_str, DATETIME_FORMAT
                 # )
                 if latest_event_timestamp is None:
                     logger.debug(
-                        f"Setting latest event timestamp to {incident_date_str} for incident {row.get('Incident Number', 'N/A')}"
+                        f"Setting latest event timestamp to {incident_date_str} for incident {msg.key().decode('utf-8')}"
                     )
                     rcli.set(REDIS_LAST_EVENT_TIMESTAMP_KEY, incident_date_str)
                 elif incident_date > latest_event_timestamp:
                     logger.debug(
-                        f"Updating latest event timestamp from {latest_event_timestamp_str} to {incident_date_str} for incident {row.get('Incident Number', 'N/A')}"
+                        f"Updating latest event timestamp from {latest_event_timestamp_str} to {incident_date_str} for incident {msg.key().decode('utf-8')}"
                     )
                     rcli.set(
                         REDIS_LAST_EVENT_TIMESTAMP_KEY,
@@ -146,15 +170,26 @@ def main():
         replication_factor=1
     )
 
+    watcher = DirectoryWatcher(CSV_FOLDER_PATH, ignore=is_index_file)
+    # files with rows left to read: new, appended or interrupted by the batch size
+    pending: set[str] = set()
+    # files whose unterminated last row is read once their size is stable, see settled_end
+    unsettled: dict[str, tuple[int, float]] = {}
     while True:
-        # Example usage
+        # waits for new or appended files instead of rescanning every MAIN_LOOP_INTERVAL
+        pending |= watcher.poll(timeout=0 if pending else MAIN_LOOP_INTERVAL)
+        pending |= {path for path, (_, seen_at) in unsettled.items() if time.time() - seen_at >= MAIN_LOOP_INTERVAL}
 
-        files = os.listdir(CSV_FOLDER_PATH)  # Ensure the file exists
+        if not watcher.files:
+            raise FileNotFoundError(f"No files found in the directory: {CSV_FOLDER_PATH}")
 
+        files = sorted(pending)
         if not files:
-            raise FileNotFoundError(f"No files found in the directory: {CSV_FOLDER_PATH}")
+            if not MAIN_LOOP:
+                break
+            continue
 
-        logger.info(f"Files found in {CSV_FOLDER_PATH}: {files}")
+        logger.info(f"Files changed in {CSV_FOLDER_PATH}: {files}")
 
         rows = []
         latest_event_timestamp: Optional[datetime] = None
@@ -176,33 +211,77 @@ def main():
         read_rows = 0
         rkey = None
         latest_key_produced = None
-        for file in files:
-            logger.info(f"Processing file: {file}")
-            csv_file_path = os.path.join(CSV_FOLDER_PATH, file)  # Get the first file in the directory
+        for csv_file_path in files:
+            logger.info(f"Processing file: {csv_file_path}")
 
             # ================= checking file redis key
             rfilek = redis_file_key(csv_file_path)
             if not rcli.exists(rfilek):
                 rcli.set(rfilek, json.dumps({"latest_row": 0, "completed": False}))
             file_status: dict = json.loads(str(rcli.get(rfilek)))
+            size = os.path.getsize(csv_file_path)
             if file_status.get("completed", False):
-                logger.debug(f"file completed: {csv_file_path}: {file_status} ")
-                continue
+                if file_status.get("size") is None:
+                    # completed before sizes were tracked, keep treating it as immutable
+                    file_status["size"] = size
+                    rcli.set(rfilek, json.dumps(file_status))
+                if size == file_status["size"]:
+                    logger.debug(f"file completed: {csv_file_path}: {file_status} ")
+                    pending.discard(csv_file_path)
+                    continue
             # ================= checking file redis key
-            for row in from_csv_generator(csv_file_path):
-                if int(file_status.get("latest_row", 0)) > int(row.get("ID", 0)):
+            # resume (or tail appended rows) from the first row not read yet
+            start = file_status.get("offset")
+            if start is not None and size < file_status.get("size", 0):
+                logger.warning(f"{csv_file_path} shrank, reading it from the beginning.")
+                start = None
+            # a row still being written is left for later
+            end = settled_end(csv_file_path, size, complete_rows_end(csv_file_path), unsettled)
+            header, _ = read_csv_header(csv_file_path) if end != 0 else ((), 0)
+            columns = {column: i for i, column in enumerate(header)}
+            if "ID" not in columns or "Incident Date" not in columns:
+                # created but not written yet (or not an incident file), read again once it changes
+                logger.warning(f"Skipping {csv_file_path} until it has an ID and Incident Date header: {header}")
+                pending.discard(csv_file_path)
+                continue
+            id_column, date_column = columns["ID"], columns["Incident Date"]
+            row: dict = {}
+            # a grown file invalidates its index, tails are read without rebuilding it
+            if CSV_INDEX and (start is None or load_csv_index(csv_file_path) is not None):
+                # only blocks that can hold rows newer than START_DATE are read
+                csv_rows = from_indexed_csv_rows(
+                    csv_file_path,
+                    [DATE_FORMAT],
+                    min_date=START_DATE,
+                    min_id=int(file_status.get("latest_row", 0)),
+                    start=start,
+                    end=end,
+                )
+            else:
+                csv_rows = from_csv_rows(csv_file_path, start, end)
+            if start:
+                logger.info(f"Reading {csv_file_path} from offset {start}.")
+            for offset, values in csv_rows:
+                if processed_rows >= batch:
+                    logger.info(f"Flushing producer after processing {processed_rows} rows...")
+                    remaining = kprod.flush(1)
+                    logger.info(f"Flushing completed.")
+                    if remaining == 0:
+                        file_status.update({"offset": offset, "size": size, "completed": False})
+                        rcli.set(rfilek, json.dumps(file_status))
+                    else:
+                        logger.warning(f"{remaining} messages not delivered yet, {csv_file_path} offset not saved.")
+                    break
+                if len(values) < len(header):
+                    logger.warning(f"skipping malformed row at offset {offset} of {csv_file_path}")
+                    continue
+                if int(file_status.get("latest_row", 0)) > int(values[id_column] or 0):
                     logger.debug(
-                        f"skipping already processed row id: {row.get("ID", 0)}"
+                        f"skipping already processed row id: {values[id_column]}"
                     )
                     continue
-                if "_end_" in row.keys():
-                    # all rows readed, marking it as completed.
-                    _s = json.loads(str(rcli.get(rfilek)))
-                    _s["completed"] = True
-                    rcli.set(rfilek, json.dumps(_s))
-                    break
                 try:
-                    incident_date_str = str(row["Incident Date"])
+                    incident_date_str = str(values[date_column])
                     if incident_date_str:
                         incident_date = datetime.strptime(
                             incident_date_str, DATE_FORMAT
@@ -213,14 +292,14 @@ def main():
                     if (read_rows % 100000) == 0:
                         hline()
                         logger.info(f"Read {read_rows} rows so far.")
-                        logger.info(f"Current row ID: {row.get('ID', 'N/A')}")
+                        logger.info(f"Current row ID: {values[id_column]}")
                         logger.info(f"Latest event timestamp: {rcli.get(REDIS_LAST_EVENT_TIMESTAMP_KEY) if rcli.exists(REDIS_LAST_EVENT_TIMESTAMP_KEY) else 'N/A'}")
                         logger.info(f"Current row incident date: {incident_date}")
                         logger.info(f"filtering rows with incident date >= {START_DATE}: {incident_date >= START_DATE}")
                         hline()
 
                     if incident_date >= START_DATE:
-
+                        row = dict(zip(header, values))
                         rkey = redis_row_key(
                             row
                         )  # to make sure all rows are processed.
@@ -252,29 +331,31 @@ def main():
                             FIRE_EVENT_SOURCE_TOPIC,
                             key=key,  #
                             value=value,
+                            headers=event_headers(values[id_column], incident_date, RAW),
                             callback=control_delivery_report,
                         )
                         # will only set the latest_key_produced if reach this point.
                         latest_key_produced = key
-
-                        if processed_rows >= batch:
-                            logger.info(f"Flushing producer after processing {processed_rows} rows...")
-
-                            kprod.flush(1)
-                            logger.info(f"Flushing completed.")
-
-                            break
                         processed_rows += 1
 
                     read_rows += 1
                 except ValueError as err:
                     logger.error(f"Invalid incident {key} error: {str(err)}.")
-                    logger.debug(row)
+                    logger.debug(values)
                     if ON_FAILURE == "continue":
                         continue
                     elif ON_FAILURE == "raise":
                         raise err
                     kprod.flush(1)
+            else:
+                # all rows readed, marking it as completed unless an unterminated row is left
+                if kprod.flush(1) == 0:
+                    completed = end is None or end >= size
+                    file_status.update({"offset": end, "size": size, "completed": completed})
+                    rcli.set(rfilek, json.dumps(file_status))
+                    pending.discard(csv_file_path)
+                else:
+                    logger.warning(f"Messages not delivered yet, {csv_file_path} offset not saved.")
 
             hline()
             file_status["latest_row"] = row.get("ID")
@@ -295,7 +376,6 @@ def main():
 
         if not MAIN_LOOP:
             break
-        time.sleep(MAIN_LOOP_INTERVAL)
 
 
 if __name__ == "__main__":
@@ -1,8 +1,10 @@
 import os 
+import re
 
 from datetime import datetime
-from dataclasses import dataclass
-from typing import Optional, Any
+from dataclasses import dataclass, fields
+from functools import lru_cache
+from typing import Optional, Any, Callable, Sequence
 from src.services.utils.dateutils import try_strptime
 from src.services.utils.logger_utils import getLogger
 
@@ -263,6 +265,147 @@ def parse_fire_event(row: Dict[str, Any]) -> FireEvent:
         raise err
 
 
+# (FireEvent field, source column, conversion) in the same order parse_fire_event
+# evaluates them, so compiled parsers fail on the same field first.
+FIRE_EVENT_COLUMNS: list[tuple[str, str, str]] = [
+    ("Incident_Number", "Incident Number", "str"),
+    ("Exposure_Number", "Exposure Number", "int"),
+    ("ID", "ID", "str"),
+    ("Address", "Address", "str"),
+    ("Incident_Date", "Incident Date", "date"),
+    ("Alarm_DtTm", "Alarm DtTm", "date"),
+    ("Arrival_DtTm", "Arrival DtTm", "date"),
+    ("Close_DtTm", "Close DtTm", "date"),
+    ("Call_Number", "Call Number", "str"),
+    ("City", "City", "str"),
+    ("zipcode", "zipcode", "str"),
+    ("Battalion", "Battalion", "str"),
+    ("Station_Area", "Station Area", "str"),
+    ("Box", "Box", "optional"),
+    ("Suppression_Units", "Suppression Units", "int"),
+    ("Suppression_Personnel", "Suppression Personnel", "int"),
+    ("EMS_Units", "EMS Units", "int"),
+    ("EMS_Personnel", "EMS Personnel", "int"),
+    ("Other_Units", "Other Units", "int"),
+    ("Other_Personnel", "Other Personnel", "int"),
+    ("First_Unit_On_Scene", "First Unit On Scene", "optional"),
+    ("Estimated_Property_Loss", "Estimated Property Loss", "optional"),
+    ("Estimated_Contents_Loss", "Estimated Contents Loss", "optional"),
+    ("Fire_Fatalities", "Fire Fatalities", "int"),
+    ("Fire_Injuries", "Fire Injuries", "int"),
+    ("Civilian_Fatalities", "Civilian Fatalities", "int"),
+    ("Civilian_Injuries", "Civilian Injuries", "int"),
+    ("Number_of_Alarms", "Number of Alarms", "int"),
+    ("Primary_Situation", "Primary Situation", "optional"),
+    ("Mutual_Aid", "Mutual Aid", "optional"),
+    ("Action_Taken_Primary", "Action Taken Primary", "optional"),
+    ("Action_Taken_Secondary", "Action Taken Secondary", "optional"),
+    ("Action_Taken_Other", "Action Taken Other", "optional"),
+    ("Detector_Alerted_Occupants", "Detector Alerted Occupants", "optional"),
+    ("Property_Use", "Property Use", "optional"),
+    ("Area_of_Fire_Origin", "Area of Fire Origin", "optional"),
+    ("Ignition_Cause", "Ignition Cause", "optional"),
+    ("Ignition_Factor_Primary", "Ignition Factor Primary", "optional"),
+    ("Ignition_Factor_Secondary", "Ignition Factor Secondary", "optional"),
+    ("Heat_Source", "Heat Source", "optional"),
+    ("Item_First_Ignited", "Item First Ignited", "optional"),
+    ("Human_Factors_Associated_with_Ignition", "Human Factors Associated with Ignition", "optional"),
+    ("Structure_Type", "Structure Type", "optional"),
+    ("Structure_Status", "Structure Status", "optional"),
+    ("Floor_of_Fire_Origin", "Floor of Fire Origin", "optional"),
+    ("Fire_Spread", "Fire Spread", "optional"),
+    ("No_Flame_Spread", "No Flame Spread", "optional"),
+    ("Number_of_floors_with_minimum_damage", "Number of floors with minimum damage", "optional"),
+    ("Number_of_floors_with_significant_damage", "Number of floors with significant damage", "optional"),
+    ("Number_of_floors_with_heavy_damage", "Number of floors with heavy damage", "optional"),
+    ("Number_of_floors_with_extreme_damage", "Number of floors with extreme damage", "optional"),
+    ("Detectors_Present", "Detectors Present", "optional"),
+    ("Detector_Type", "Detector Type", "optional"),
+    ("Detector_Operation", "Detector Operation", "optional"),
+    ("Detector_Effectiveness", "Detector Effectiveness", "optional"),
+    ("Detector_Failure_Reason", "Detector Failure Reason", "optional"),
+    ("Automatic_Extinguishing_System_Present", "Automatic Extinguishing System Present", "optional"),
+    ("Automatic_Extinguishing_System_Type", "Automatic Extinguishing Sytem Type", "optional"),
+    ("Automatic_Extinguishing_System_Perfomance", "Automatic Extinguishing Sytem Perfomance", "optional"),
+    ("Automatic_Extinguishing_System_Failure_Reason", "Automatic Extinguishing Sytem Failure Reason", "optional"),
+    ("Number_of_Sprinkler_Heads_Operating", "Number of Sprinkler Heads Operating", "optional"),
+    ("Supervisor_District", "Supervisor District", "optional"),
+    ("neighborhood_district", "neighborhood_district", "optional"),
+    ("point", "point", "optional"),
+    ("data_as_of", "data_as_of", "optional"),
+    ("data_loaded_at", "data_loaded_at", "optional"),
+]
+
+
+def _to_int(value: Optional[str]) -> Optional[int]:
+    if value and value.strip().isdigit():
+        return int(value)
+    return 0
+
+
+@lru_cache(maxsize=8192)
+def _to_date(value: Optional[str]) -> Optional[datetime]:
+    # Incident dates repeat for every row of the same day; strptime dominates parsing.
+    return try_strptime(value, EFFECTIVE_DATE_FORMAT)
+
+
+_CONVERTERS = {
+    "str": "{}",
+    "optional": "{} or None",
+    "int": "_to_int({})",
+    "date": "_to_date({})",
+}
+
+
+@lru_cache(maxsize=32)
+def _compile_parser(header: Optional[tuple[str, ...]]) -> Callable[[Any], FireEvent]:
+    if header is None:
+        accessors = {column: f"row[{column!r}]" for _, column, _ in FIRE_EVENT_COLUMNS}
+    else:
+        positions = {column: i for i, column in enumerate(header)}
+        missing = [c for _, c, _ in FIRE_EVENT_COLUMNS if c not in positions]
+        if missing:
+            raise KeyError(f"Header is missing required columns: {missing}")
+        accessors = {column: f"row[{i}]" for column, i in positions.items()}
+
+    lines = ["def parse(row):", "    try:"]
+    for field, column, kind in FIRE_EVENT_COLUMNS:
+        lines.append(f"        {field} = {_CONVERTERS[kind].format(accessors[column])}")
+    arguments = ", ".join(f.name for f in fields(FireEvent))
+    lines += [
+        f"        return FireEvent({arguments})",
+        "    except Exception as err:",
+        "        logger.debug(f'provided row: {row}')",
+        "        raise err",
+    ]
+    namespace = {
+        "FireEvent": FireEvent,
+        "_to_int": _to_int,
+        "_to_date": _to_date,
+        "logger": logger,
+    }
+    exec("\n".join(lines), namespace)
+    return namespace["parse"]
+
+
+def compile_fire_event_parser(
+    header: Optional[Sequence[str]] = None,
+) -> Callable[[Any], FireEvent]:
+    """
+    Build a parser specialized for a row layout, equivalent to parse_fire_event.
+
+    The column mapping is resolved once and every field is looked up and converted
+    exactly once per row. Conversion and error behaviour (KeyError on missing
+    columns, ValueError on bad dates) match parse_fire_event, so callers keep
+    their ON_FAILURE handling unchanged.
+
+    :param header: CSV header when rows are sequences (csv.reader rows/tuples).
+                   Leave as None to parse dicts keyed by column name.
+    :return: A function that turns one row into a FireEvent.
+    """
+    return _compile_parser(tuple(header) if header is not None else None)
+
+
 def data_quality_analysis(row: FireEvent) -> dict:
     """
     Perform data quality analysis on a single row of fire event data.
@@ -288,11 +431,13 @@ def data_quality_analysis(row: FireEvent) -> dict:
     return issues
 
 
-def fire_event_to_key(event: FireEvent, prefix: str = "fire_event:") -> str:
+def fire_event_to_key(event: FireEvent, prefix: str = "fire_event:", hash_tag: bool = False) -> str:
     """
     Generate a unique key for a FireEvent object based on its ID and Incident Date.
 
     :param event: A FireEvent object.
+    :param hash_tag: Wrap the Incident_Number in a cluster hash tag ({...}), so
+        every revision of an incident is stored in the same slot.
     :return: A string representing the unique key for the FireEvent.
     """
     if not event.Incident_Date:
@@ -300,4 +445,28 @@ def fire_event_to_key(event: FireEvent, prefix: str = "fire_event:") -> str:
     if not event.Incident_Number:
         raise ValueError("Incident_Number not set")
 
-    return f"{prefix}{":" if prefix else ""}{event.Incident_Number}"
+    incident = f"{{{event.Incident_Number}}}" if hash_tag else event.Incident_Number
+    return f"{prefix}{":" if prefix else ""}{incident}"
+
+
+_NUMBER = r"-?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?"
+_WKT_POINT = re.compile(rf"^\s*POINT\s*\(\s*({_NUMBER})\s+({_NUMBER})\s*\)\s*$", re.IGNORECASE)
+
+
+def parse_point(point: Optional[str]) -> Optional[tuple[float, float]]:
+    """
+    Parse a WKT point, e.g. "POINT (-122.4194 37.7749)".
+
+    :param point: The FireEvent point value.
+    :return: (longitude, latitude), None when missing, malformed or out of range.
+    """
+    if not point:
+        return None
+    match = _WKT_POINT.match(point)
+    if not match:
+        return None
+    lon, lat = float(match.group(1)), float(match.group(2))
+    if not (-180 <= lon <= 180 and -85.05112878 <= lat <= 85.05112878):
+        # outside the range accepted by Redis GEO
+        return None
+    return lon, lat
@@ -0,0 +1,63 @@
+import os
+
+from dataclasses import asdict
+
+from src.services.models.fire_event import FireEvent, parse_point
+from src.services.utils.redis_utils import (
+    TagField,
+    NumericField,
+    GeoField,
+    create_versioned_index,
+    delete_versioned_index,
+)
+
+# Key layout and index of the serving layer. Importing this module has no side
+# effects, analysis code and jobs use it instead of the serving service module.
+
+REDIS_EVENT_KEY_PREFIX = f"fireevent"
+# per Incident_Date day write generations, used to invalidate cached query results
+REDIS_GENERATION_KEY = f"{REDIS_EVENT_KEY_PREFIX}:generation"
+# capped stream of every write, tailed by dashboards (see utils/change_feed.py)
+REDIS_CHANGE_FEED_KEY = f"{REDIS_EVENT_KEY_PREFIX}:changes"
+# changed by the writers deleting or creating event keys behind the serving layer (see utils/existence_filter.py)
+REDIS_EXISTENCE_EPOCH_KEY = f"{REDIS_EVENT_KEY_PREFIX}:existence"
+REDIS_EVENT_INDEX_ID = f"{os.environ.get("REDIS_EVENT_INDEX_ID","fireevent")}_idx"
+
+
+# REDIS_EVENT_INDEX_ID schema, also used to validate analysis queries (see analysis/utils/query.py)
+EVENT_INDEX_SCHEMA = [
+    TagField("Incident_Number"),  # Grouping/filtering by incident number
+    TagField("neighborhood_district"),  # District as tag field
+    TagField("Battalion"),  # Battalion as tag field
+    NumericField("ID", sortable=True),  # Row ID as numeric, sortable
+    NumericField("Alarm_DtTm", sortable=True),  # ISO date-time string, sortable
+    NumericField("Incident_Date", sortable=True),  # ISO date-time string, sortable
+    GeoField("location"),  # "lon,lat" parsed from point, radius queries
+    NumericField("longitude"),  # bounding box queries
+    NumericField("latitude"),
+]
+
+
+def create_indexes():
+    """
+        create all required indexes for the serving layer
+    """
+    # REDIS_EVENT_INDEX_ID is an alias, a changed schema is built aside and swapped in
+    create_versioned_index(REDIS_EVENT_INDEX_ID, EVENT_INDEX_SCHEMA, prefixes=[f"{REDIS_EVENT_KEY_PREFIX}"])
+
+
+def recreate_indexes():
+    delete_versioned_index(REDIS_EVENT_INDEX_ID)
+    create_indexes()
+
+def fire_event_to_hash(event: FireEvent) -> dict:
+    """
+    Hash fields of an event: every FireEvent field plus its parsed location.
+    Events without a valid point get no location fields, so they stay indexed.
+    """
+    data = asdict(event)
+    lon_lat = parse_point(event.point)
+    if lon_lat:
+        data["location"] = f"{lon_lat[0]},{lon_lat[1]}"
+        data["longitude"], data["latitude"] = lon_lat
+    return data
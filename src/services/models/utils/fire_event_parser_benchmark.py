@@ -0,0 +1,96 @@
+"""
+Compare parse_fire_event against the compiled parsers.
+
+usage: python -m src.services.models.utils.fire_event_parser_benchmark [csv_path]
+
+Without a csv_path a synthetic row is used.
+"""
+import csv
+import sys
+import time
+
+from src.services.utils.logger_utils import getLogger, hline
+from src.services.models.fire_event import (
+    FIRE_EVENT_COLUMNS,
+    compile_fire_event_parser,
+    parse_fire_event,
+)
+
+logger = getLogger(__file__)
+
+ROUNDS = 3
+SYNTHETIC_ROWS = 50000
+
+
+def synthetic_rows(count: int) -> tuple[list[str], list[list[str]]]:
+    header = [column for _, column, _ in FIRE_EVENT_COLUMNS]
+    values = {
+        "date": "2024/05/30 {hour:02d}:{minute:02d}:{second:02d}",
+        "int": "2",
+        "str": "B09",
+        "optional": "",
+    }
+    rows = []
+    for i in range(count):
+        row = []
+        for j, (_, _, kind) in enumerate(FIRE_EVENT_COLUMNS):
+            second = i * 4 + j  # distinct timestamps per row and column
+            row.append(values[kind].format(hour=second // 3600 % 24, minute=second // 60 % 60, second=second % 60))
+        row[header.index("Incident Date")] = "2024/05/30"
+        row[header.index("ID")] = str(i)
+        rows.append(row)
+    return header, rows
+
+
+def csv_rows(path: str) -> tuple[list[str], list[list[str]]]:
+    with open(path, "r") as csvfile:
+        reader = csv.reader(csvfile)
+        header = next(reader)
+        return header, [row for row in reader if len(row) == len(header)]
+
+
+def events_per_second(parse, rows) -> float:
+    best = None
+    for _ in range(ROUNDS):
+        failures = 0
+        start = time.perf_counter()
+        for row in rows:
+            try:
+                parse(row)
+            except (KeyError, ValueError):
+                failures += 1
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(rows) / best
+
+
+def main():
+    header, rows = csv_rows(sys.argv[1]) if len(sys.argv) > 1 else synthetic_rows(SYNTHETIC_ROWS)
+    dict_rows = [dict(zip(header, row)) for row in rows]
+    tuple_rows = [tuple(row) for row in rows]
+
+    parse_dict = compile_fire_event_parser()
+    parse_tuple = compile_fire_event_parser(header)
+
+    for row, dict_row in zip(tuple_rows[:1000], dict_rows[:1000]):
+        try:
+            expected = parse_fire_event(dict_row)
+        except (KeyError, ValueError):
+            continue
+        assert parse_dict(dict_row) == expected
+        assert parse_tuple(row) == expected
+
+    hline(header=f"parsing {len(rows)} rows")
+    baseline = events_per_second(parse_fire_event, dict_rows)
+    logger.info(f"parse_fire_event (dict):            {baseline:>12,.0f} events/s")
+    for name, parse, data in [
+        ("compile_fire_event_parser (dict)", parse_dict, dict_rows),
+        ("compile_fire_event_parser (tuple)", parse_tuple, tuple_rows),
+    ]:
+        eps = events_per_second(parse, data)
+        logger.info(f"{name + ':':<36}{eps:>12,.0f} events/s ({eps / baseline:.2f}x)")
+    hline()
+
+
+if __name__ == "__main__":
+    main()
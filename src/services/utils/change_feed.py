@@ -0,0 +1,86 @@
+import os
+import redis
+
+from datetime import datetime
+from typing import Iterator, Optional
+
+from src.services.utils.logger_utils import getLogger
+
+logger = getLogger(__file__)
+
+CHANGE_FEED_MAXLEN = int(os.getenv("CHANGE_FEED_MAXLEN", 100000))
+CHANGE_FEED_BLOCK_MS = int(os.getenv("CHANGE_FEED_BLOCK_MS", 5000))
+CHANGE_FEED_READ_COUNT = int(os.getenv("CHANGE_FEED_READ_COUNT", 500))
+
+# operations recorded in the feed
+CREATE, REPLACE, VERSION = "create", "replace", "version"
+
+
+def change_record(key: str, revision: int, operation: str, incident_date: Optional[datetime], battalion) -> dict:
+    """
+    Compact change entry: the event key without revision, the written revision,
+    the operation, the Incident_Date timestamp and the Battalion.
+    """
+    return {
+        "key": key,
+        "revision": revision,
+        "op": operation,
+        "Incident_Date": incident_date.timestamp() if incident_date else "",
+        "Battalion": battalion or "",
+    }
+
+
+def append_change(pipe, stream: str, record: dict, maxlen: int = CHANGE_FEED_MAXLEN) -> None:
+    """
+    Queue an XADD of a change record on a pipeline, the stream is capped to about
+    maxlen entries (approximate trimming is O(1) amortized).
+    """
+    pipe.xadd(stream, record, maxlen=maxlen, approximate=True)
+
+
+def ensure_group(r: redis.Redis, stream: str, group: str, start: str = "$") -> None:
+    """
+    Create a consumer group on the stream (and the stream) if it does not exist.
+    :param start: "$" to only read changes made from now on, "0" for the whole retained feed.
+    """
+    try:
+        r.xgroup_create(stream, group, id=start, mkstream=True)
+        logger.info(f"Consumer group {group} created on {stream} at {start}.")
+    except redis.exceptions.ResponseError as err:
+        if "BUSYGROUP" not in str(err):
+            raise
+
+
+def tail_changes(
+    r: redis.Redis,
+    stream: str,
+    group: str,
+    consumer: str,
+    start: str = "$",
+    count: int = CHANGE_FEED_READ_COUNT,
+    block_ms: int = CHANGE_FEED_BLOCK_MS,
+    stop=lambda: False,
+) -> Iterator[list[tuple[str, dict]]]:
+    """
+    Tail a change feed with a consumer group, yielding batches of (id, record).
+
+    A batch is acknowledged when the caller asks for the next one, so changes
+    being processed when a reader crashes are delivered again to the same
+    consumer name: its pending entries are read first on restart. Consumers of
+    the same group share the feed, each group receives every change.
+
+    :param consumer: Stable name of this reader within the group.
+    :param start: Group start position when it is created, see ensure_group.
+    :param stop: Called before every read, ends the generator when True.
+    """
+    ensure_group(r, stream, group, start)
+    position = "0"  # own pending entries first, then new ones
+    while not stop():
+        reply = r.xreadgroup(group, consumer, {stream: position}, count=count, block=block_ms)
+        entries = reply[0][1] if reply else []
+        if not entries:
+            if position == "0":
+                position = ">"
+            continue
+        yield entries
+        r.xack(stream, group, *[entry_id for entry_id, _ in entries])
@@ -0,0 +1,130 @@
+import os
+import uuid
+from datetime import datetime
+from typing import Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.services.utils.logger_utils import getLogger
+
+logger = getLogger(__file__)
+
+COLD_STORAGE_PATH = os.environ.get("COLD_STORAGE_PATH", "/data/cold/fire_events")
+COLD_STORAGE_COMPRESSION = os.environ.get("COLD_STORAGE_COMPRESSION", "zstd")
+ROW_GROUP_SIZE = int(os.environ.get("PARQUET_ROW_GROUP_SIZE", 128 * 1024))
+PARTITION_COLUMN = "Incident_Date"
+
+
+def partition_path(root: str, year: int, month: int) -> str:
+    return os.path.join(root, f"year={year:04d}", f"month={month:02d}")
+
+
+def _write_table(table: pa.Table, folder: str) -> str:
+    os.makedirs(folder, exist_ok=True)
+    name = f"part-{datetime.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}.parquet"
+    path = os.path.join(folder, name)
+    # column statistics let readers skip row groups on their filters
+    pq.write_table(
+        table,
+        f"{path}.tmp",
+        compression=COLD_STORAGE_COMPRESSION,
+        row_group_size=ROW_GROUP_SIZE,
+        write_statistics=True,
+    )
+    os.replace(f"{path}.tmp", path)
+    return path
+
+
+def write_partitions(
+    df: pd.DataFrame, root: str = COLD_STORAGE_PATH, schema: Optional[pa.Schema] = None
+) -> dict[str, int]:
+    """
+    Append events to the monthly Parquet partitions of root, one new part file
+    per month present in df. Files are written to a temporary name and renamed,
+    readers never see a partial file.
+
+    :param df: Events with an Incident_Date datetime column.
+    :param schema: Arrow schema of the files, so every part file of a dataset
+        has the same column types whatever the batch contains.
+    :return: Rows written per part file.
+    """
+    written = {}
+    df = df.copy()
+    # plain strings keep the files readable without pandas categories
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype("string")
+    dates = df[PARTITION_COLUMN]
+    for (year, month), part in df.groupby([dates.dt.year, dates.dt.month]):
+        table = pa.Table.from_pandas(part, schema=schema, preserve_index=False)
+        path = _write_table(table, partition_path(root, int(year), int(month)))
+        written[path] = len(part)
+    return written
+
+
+def compact_partition(
+    folder: str, unique: Optional[list[str]] = None, sort_by: Optional[str] = PARTITION_COLUMN
+) -> Optional[str]:
+    """
+    Merge the part files of a partition into one, sorted by sort_by so row group
+    statistics are selective. The merged file is in place before the parts are
+    removed: a crash leaves duplicated rows, never lost ones.
+
+    :param unique: Columns identifying a row, duplicates (e.g. replayed
+        messages) are dropped.
+    :return: The compacted file, None when there was nothing to compact.
+    """
+    parts = sorted(os.path.join(folder, f) for f in os.listdir(folder) if f.endswith(".parquet"))
+    if len(parts) < 2:
+        return None
+    table = pa.concat_tables([pq.read_table(p) for p in parts], promote_options="default")
+    df = table.to_pandas()
+    if unique:
+        df = df.drop_duplicates(subset=unique, keep="last")
+    if sort_by and sort_by in df:
+        df = df.sort_values(sort_by, kind="stable")
+    path = _write_table(pa.Table.from_pandas(df, schema=table.schema, preserve_index=False), folder)
+    for part in parts:
+        os.remove(part)
+    logger.info(f"Compacted {len(parts)} files ({table.num_rows} rows) into {path} ({len(df)} rows).")
+    return path
+
+
+def compact_partitions(root: str = COLD_STORAGE_PATH, min_files: int = 2, **kwargs) -> int:
+    """
+    Compact every partition of root with at least min_files part files.
+    :return: Number of compacted partitions.
+    """
+    compacted = 0
+    folders = sorted({os.path.dirname(path) for path in partition_files(root)})
+    for folder in folders:
+        if sum(f.endswith(".parquet") for f in os.listdir(folder)) >= min_files:
+            compacted += compact_partition(folder, **kwargs) is not None
+    return compacted
+
+
+def partition_files(
+    root: str = COLD_STORAGE_PATH, start: Optional[datetime] = None, end: Optional[datetime] = None
+) -> list[str]:
+    """
+    Parquet files of the monthly partitions overlapping [start, end], all when open.
+    """
+    if not os.path.isdir(root):
+        return []
+    low = (start.year, start.month) if start else (0, 0)
+    high = (end.year, end.month) if end else (9999, 12)
+    files = []
+    for year_dir in sorted(os.listdir(root)):
+        if not year_dir.startswith("year="):
+            continue
+        for month_dir in sorted(os.listdir(os.path.join(root, year_dir))):
+            if not month_dir.startswith("month="):
+                continue
+            key = (int(year_dir[5:]), int(month_dir[6:]))
+            if not low <= key <= high:
+                continue
+            folder = os.path.join(root, year_dir, month_dir)
+            files += [os.path.join(folder, f) for f in sorted(os.listdir(folder)) if f.endswith(".parquet")]
+    return files
@@ -0,0 +1,189 @@
+import os
+import json
+from datetime import datetime
+from typing import Iterator, Optional
+
+from src.services.utils.logger_utils import getLogger
+from src.services.utils.csv_utils import from_csv_rows, read_csv_header
+from src.services.utils.dateutils import try_strptime
+
+logger = getLogger(__file__)
+
+INDEX_SUFFIX = ".idx.json"
+INDEX_VERSION = 1
+BLOCK_ROWS = int(os.environ.get("CSV_INDEX_BLOCK_ROWS", 10000))
+
+
+def index_path(file_path: str) -> str:
+    return f"{file_path}{INDEX_SUFFIX}"
+
+
+def is_index_file(file_path: str) -> bool:
+    return file_path.endswith(INDEX_SUFFIX)
+
+
+def _fingerprint(file_path: str) -> dict:
+    stat = os.stat(file_path)
+    return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def _new_block(start: int) -> dict:
+    return {
+        "start": start,
+        "end": start,
+        "rows": 0,
+        "min_date": None,
+        "max_date": None,
+        "min_id": None,
+        "max_id": None,
+        "complete": True,  # False when some row had no parsable date/ID
+    }
+
+
+def build_csv_index(
+    file_path: str,
+    date_formats: list[str],
+    date_column: str = "Incident Date",
+    id_column: str = "ID",
+    block_rows: int = BLOCK_ROWS,
+) -> dict:
+    """
+    Scan a CSV once and write a sidecar zone map next to it ({file_path}.idx.json).
+
+    Every block of block_rows rows records its byte range and the min/max
+    date_column (as timestamps) and id_column it contains.
+
+    :param file_path: Path to the CSV file.
+    :param date_formats: Formats used to parse date_column.
+    :param date_column: Column used for date range pruning.
+    :param id_column: Numeric column used for ID range pruning.
+    :param block_rows: Rows per block.
+    :return: The index.
+    """
+    fingerprint = _fingerprint(file_path)
+    header, first_row = read_csv_header(file_path)
+    date_i, id_i = header.index(date_column), header.index(id_column)
+
+    blocks = []
+    block = _new_block(first_row)
+    for offset, values in from_csv_rows(file_path):
+        if block["rows"] >= block_rows:
+            block["end"] = offset
+            blocks.append(block)
+            block = _new_block(offset)
+        block["rows"] += 1
+        try:
+            ts = try_strptime(values[date_i], date_formats).timestamp()
+            row_id = int(values[id_i])
+        except (ValueError, IndexError):
+            block["complete"] = False
+            continue
+        block["min_date"] = ts if block["min_date"] is None else min(block["min_date"], ts)
+        block["max_date"] = ts if block["max_date"] is None else max(block["max_date"], ts)
+        block["min_id"] = row_id if block["min_id"] is None else min(block["min_id"], row_id)
+        block["max_id"] = row_id if block["max_id"] is None else max(block["max_id"], row_id)
+    if block["rows"]:
+        block["end"] = None  # up to the end of the file
+        blocks.append(block)
+
+    index = {
+        "version": INDEX_VERSION,
+        "file": os.path.basename(file_path),
+        "date_column": date_column,
+        "id_column": id_column,
+        "blocks": blocks,
+        **fingerprint,
+    }
+    tmp_path = f"{index_path(file_path)}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(index, f)
+    os.replace(tmp_path, index_path(file_path))
+    logger.info(f"Indexed {file_path}: {len(blocks)} blocks of {block_rows} rows.")
+    return index
+
+
+def load_csv_index(file_path: str) -> Optional[dict]:
+    """
+    Load the sidecar index of a CSV file.
+    :return: The index, or None when it is missing or the file changed (size/mtime) since it was built.
+    """
+    try:
+        with open(index_path(file_path), "r") as f:
+            index = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    fingerprint = _fingerprint(file_path)
+    if index.get("version") != INDEX_VERSION or any(
+        index.get(k) != v for k, v in fingerprint.items()
+    ):
+        logger.debug(f"Index for {file_path} is stale.")
+        return None
+    return index
+
+
+def get_csv_index(file_path: str, date_formats: list[str]) -> dict:
+    """
+    Load the sidecar index of a CSV file, (re)building it when missing or stale.
+    """
+    index = load_csv_index(file_path)
+    if index is None:
+        index = build_csv_index(file_path, date_formats)
+    return index
+
+
+def select_blocks(
+    index: dict, min_date: Optional[datetime] = None, min_id: Optional[int] = None
+) -> list[dict]:
+    """
+    Select the blocks that may contain rows with date >= min_date and ID >= min_id.
+    Blocks with rows that could not be indexed are always selected.
+    """
+    min_ts = min_date.timestamp() if min_date else None
+    selected = []
+    for block in index["blocks"]:
+        if block["complete"] and block["max_date"] is not None:
+            if min_ts is not None and block["max_date"] < min_ts:
+                continue
+            if min_id is not None and block["max_id"] < min_id:
+                continue
+        selected.append(block)
+    return selected
+
+
+def from_indexed_csv_rows(
+    file_path: str,
+    date_formats: list[str],
+    min_date: Optional[datetime] = None,
+    min_id: Optional[int] = None,
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+) -> Iterator[tuple[int, list[str]]]:
+    """
+    Like from_csv_rows, but only reads the blocks that can hold rows with
+    date >= min_date and ID >= min_id. Rows of a selected block are not
+    filtered, callers keep applying their own row-level checks.
+    """
+    index = get_csv_index(file_path, date_formats)
+    blocks = select_blocks(index, min_date, min_id)
+    logger.info(
+        f"Reading {len(blocks)}/{len(index['blocks'])} blocks of {file_path} "
+        f"(date >= {min_date}, ID >= {min_id})."
+    )
+    # adjacent blocks are read in a single pass
+    ranges: list[list] = []
+    for block in blocks:
+        if ranges and ranges[-1][1] == block["start"]:
+            ranges[-1][1] = block["end"]
+        else:
+            ranges.append([block["start"], block["end"]])
+
+    for range_start, range_end in ranges:
+        if start is not None:
+            if range_end is not None and range_end <= start:
+                continue
+            range_start = max(range_start, start)
+        if end is not None:
+            if range_start >= end:
+                break
+            range_end = end if range_end is None else min(range_end, end)
+        yield from from_csv_rows(file_path, range_start, range_end)
@@ -1,5 +1,12 @@
+import io
 import csv
+import gzip
+import mmap
+from contextlib import contextmanager
 from datetime import datetime
+from typing import Iterator, Optional
+
+ENCODING = "utf-8"
 
 
 def from_csv_generator(file_path):
@@ -8,3 +15,98 @@ def from_csv_generator(file_path):
         for row in reader:
             yield row
     yield {"_end_": True}
+
+
+@contextmanager
+def open_binary(file_path: str, offset: int = 0):
+    """
+    Open a CSV file as a binary stream positioned at offset.
+    Plain files are memory-mapped, .gz and .zst files are decompressed as a stream
+    (offsets refer to the decompressed content).
+    :param file_path: Path to the CSV file.
+    :param offset: Byte offset to start reading from.
+    """
+    if file_path.endswith(".gz"):
+        with gzip.open(file_path, "rb") as stream:
+            stream.seek(offset)
+            yield stream
+    elif file_path.endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError as err:
+            raise ImportError(f"zstandard is required to read {file_path}") from err
+        with open(file_path, "rb") as raw:
+            with zstandard.ZstdDecompressor().stream_reader(raw) as stream:
+                stream.seek(offset)  # forward only, decompresses and discards
+                yield io.BufferedReader(stream)
+    else:
+        with open(file_path, "rb") as raw:
+            try:
+                mapped = mmap.mmap(raw.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # empty files cannot be mapped
+                yield raw
+                return
+            with mapped:
+                mapped.seek(offset)
+                yield mapped
+
+
+def complete_rows_end(file_path: str) -> Optional[int]:
+    """
+    Byte offset just after the last complete line of a plain CSV file, so a row
+    that is still being appended is not read.
+    :param file_path: Path to the CSV file.
+    :return: The offset, or None for compressed files.
+    """
+    if file_path.endswith((".gz", ".zst")):
+        return None
+    with open_binary(file_path) as stream:
+        if not isinstance(stream, mmap.mmap):
+            return 0
+        return stream.rfind(b"\n") + 1
+
+
+def read_csv_header(file_path: str) -> tuple[tuple[str, ...], int]:
+    """
+    Read the CSV header.
+    :param file_path: Path to the CSV file.
+    :return: The column names and the byte offset of the first data row.
+    """
+    with open_binary(file_path) as stream:
+        line = stream.readline()
+    header = next(csv.reader([line.decode(ENCODING)]), [])
+    return tuple(header), len(line)
+
+
+def from_csv_rows(
+    file_path: str, start: Optional[int] = None, end: Optional[int] = None
+) -> Iterator[tuple[int, list[str]]]:
+    """
+    Yield (offset, values) for every data row of a CSV file.
+
+    Rows are plain lists positioned like read_csv_header(file_path)[0], no dict is
+    built per row. offset is the byte offset of the row in the (decompressed) file
+    and can be passed back as start to resume reading from that row.
+
+    :param file_path: Path to the CSV file (.csv, .csv.gz or .csv.zst).
+    :param start: Byte offset of the first row to read, defaults to the row after the header.
+    :param end: Stop before the row starting at or after this byte offset.
+    """
+    _, first_row = read_csv_header(file_path)
+    offset = first_row if start is None else max(start, first_row)
+    consumed = [offset]
+
+    with open_binary(file_path, offset) as stream:
+
+        def lines():
+            for line in iter(stream.readline, b""):
+                consumed[0] += len(line)
+                yield line.decode(ENCODING)
+
+        for values in csv.reader(lines()):
+            if end is not None and offset >= end:
+                return
+            if values:
+                yield offset, values
+            offset = consumed[0]
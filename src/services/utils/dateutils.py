@@ -1,3 +1,5 @@
+import logging
+
 from src.services.utils.logger_utils import getLogger
 from datetime import datetime
 
@@ -19,7 +21,8 @@ def try_strptime(date_str: str | None, formats: list[str]) -> datetime:
     if not isinstance(formats, list):
         raise ValueError(f"Expected formats to be a list, got {type(formats)}")
 
-    logger.debug(f"Trying to parse date: {date_str} with formats: {formats}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Trying to parse date: {date_str} with formats: {formats}")
     for fmt in formats:
         try:
             return datetime.strptime(date_str, fmt)
@@ -0,0 +1,49 @@
+import os
+
+from datetime import datetime
+from typing import Optional
+
+# bumped when the payload changes incompatibly, consumers skip versions they do not know
+EVENT_SCHEMA_VERSION = int(os.getenv("EVENT_SCHEMA_VERSION", 1))
+
+HEADER_ID = "id"
+HEADER_INCIDENT_DATE = "incident_date"
+HEADER_SCHEMA_VERSION = "schema_version"
+HEADER_VALIDATION = "validation"
+
+# validation status: produced by the source, passed or failed the data quality checks
+RAW, VALID, INVALID = "raw", "valid", "invalid"
+
+
+def event_headers(id, incident_date: Optional[datetime], validation: str) -> list[tuple[str, bytes]]:
+    """
+    Kafka headers describing an event, so consumers can filter, route and
+    checkpoint without deserializing the payload. Incident_Date is an epoch
+    timestamp (as in the serving hashes), empty when unknown.
+    """
+    return [
+        (HEADER_ID, str(id if id is not None else "").encode()),
+        (HEADER_INCIDENT_DATE, str(incident_date.timestamp() if incident_date else "").encode()),
+        (HEADER_SCHEMA_VERSION, str(EVENT_SCHEMA_VERSION).encode()),
+        (HEADER_VALIDATION, validation.encode()),
+    ]
+
+
+def read_headers(msg) -> dict[str, str]:
+    """
+    Decoded headers of a message, empty for messages produced without them.
+    """
+    return {name: value.decode() if value is not None else "" for name, value in msg.headers() or []}
+
+
+def header_incident_date(headers: dict[str, str]) -> Optional[datetime]:
+    value = headers.get(HEADER_INCIDENT_DATE)
+    return datetime.fromtimestamp(float(value)) if value else None
+
+
+def supported_schema(headers: dict[str, str]) -> bool:
+    """
+    False for payloads of a schema version newer than this consumer knows.
+    Messages without headers predate them and are version 1.
+    """
+    return int(headers.get(HEADER_SCHEMA_VERSION) or 1) <= EVENT_SCHEMA_VERSION
@@ -0,0 +1,180 @@
+import os
+import math
+import time
+import hashlib
+import redis
+
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from src.services.utils.logger_utils import getLogger
+
+logger = getLogger(__file__)
+
+EXISTENCE_FILTER_CAPACITY = int(os.getenv("EXISTENCE_FILTER_CAPACITY", 1_000_000))
+EXISTENCE_FILTER_ERROR_RATE = float(os.getenv("EXISTENCE_FILTER_ERROR_RATE", 0.01))
+EXISTENCE_CACHE_SIZE = int(os.getenv("EXISTENCE_CACHE_SIZE", 100_000))
+# keys written by other processes are only seen after a refresh, 0 disables it
+EXISTENCE_FILTER_REFRESH_INTERVAL = float(os.getenv("EXISTENCE_FILTER_REFRESH_INTERVAL", 3600))
+EXISTENCE_FILTER_SCAN_COUNT = int(os.getenv("EXISTENCE_FILTER_SCAN_COUNT", 10000))
+
+
+class BloomFilter:
+    """
+    In-memory Bloom filter sized for capacity items at error_rate false positives.
+    Items can be added, never removed; a negative answer is exact.
+    """
+
+    def __init__(self, capacity: int = EXISTENCE_FILTER_CAPACITY, error_rate: float = EXISTENCE_FILTER_ERROR_RATE):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str) -> Iterable[int]:
+        # double hashing, k positions out of one 128 bits digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+def invalidate_existence_filters(rcli: redis.Redis, epoch_key: str) -> None:
+    """
+    Make every ExistenceFilter watching epoch_key rebuild on its next use.
+    Called by the writers that create or delete keys behind the serving layer
+    (tiering, restore, backfill).
+    """
+    rcli.set(epoch_key, time.time_ns())
+
+
+class ExistenceFilter:
+    """
+    Local answer to "does this key exist in Redis?" for keys this process
+    creates (the serving layer writes the keys of its Kafka partitions):
+
+    - a bounded LRU of keys known to be present answers "present"
+    - a Bloom filter of every known key answers "absent" when it does not hold the key
+    - anything else is uncertain and checked in Redis by the caller
+
+    The filter is warmed with a SCAN of the pattern and kept in sync with
+    add() by the writer. invalidate() (e.g. on a partition reassignment, when
+    keys written by another replica become ours) rebuilds it on the next use.
+
+    Other writers creating or deleting matching keys must call
+    invalidate_existence_filters() on epoch_key, read once per exists() call:
+    tiering, restore and backfill do. Any other writer (manual deletes, a
+    FLUSHDB) must run while serving is stopped, otherwise the filter answers
+    from a stale keyspace until the next refresh.
+    """
+
+    def __init__(
+        self,
+        rcli: redis.Redis,
+        pattern: str,
+        capacity: int = EXISTENCE_FILTER_CAPACITY,
+        error_rate: float = EXISTENCE_FILTER_ERROR_RATE,
+        cache_size: int = EXISTENCE_CACHE_SIZE,
+        refresh_interval: float = EXISTENCE_FILTER_REFRESH_INTERVAL,
+        epoch_key: Optional[str] = None,
+    ):
+        self.rcli = rcli
+        self.pattern = pattern
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.cache_size = cache_size
+        self.refresh_interval = refresh_interval
+        self.epoch_key = epoch_key
+        self.epoch = None
+        self.bloom: Optional[BloomFilter] = None
+        self.present: OrderedDict[str, None] = OrderedDict()
+        self.warmed_at = 0.0
+        self.stats = {"present_hits": 0, "absent_hits": 0, "redis_lookups": 0, "false_positives": 0, "warmups": 0}
+
+    def invalidate(self) -> None:
+        self.bloom = None
+
+    def warm(self) -> int:
+        """
+        Rebuild the filter from the keys matching the pattern.
+        :return: Number of keys loaded.
+        """
+        start = time.time()
+        # read first, a change during the scan rebuilds the filter again
+        self.epoch = self.rcli.get(self.epoch_key) if self.epoch_key else None
+        bloom = BloomFilter(self.capacity, self.error_rate)
+        for key in self.rcli.scan_iter(match=self.pattern, count=EXISTENCE_FILTER_SCAN_COUNT):
+            bloom.add(key)
+        if bloom.count > self.capacity:
+            logger.warning(
+                f"{bloom.count} keys exceed EXISTENCE_FILTER_CAPACITY={self.capacity}, "
+                f"more lookups will fall back to Redis."
+            )
+        self.bloom = bloom
+        self.present.clear()
+        self.warmed_at = time.time()
+        self.stats["warmups"] += 1
+        logger.info(f"Existence filter warmed with {bloom.count} keys in {self.warmed_at - start:.1f}s.")
+        return bloom.count
+
+    def _remember(self, key: str) -> None:
+        self.present[key] = None
+        self.present.move_to_end(key)
+        if len(self.present) > self.cache_size:
+            self.present.popitem(last=False)
+
+    def add(self, keys: Iterable[str]) -> None:
+        """
+        Record keys the writer created.
+        """
+        if self.bloom is None:
+            return
+        for key in keys:
+            self.bloom.add(key)
+            self._remember(key)
+
+    def exists(self, keys: list[str]) -> dict[str, bool]:
+        """
+        Existence of keys, answered locally when possible. Uncertain keys are
+        checked with one pipelined EXISTS.
+        """
+        if (
+            self.bloom is None
+            or (self.refresh_interval and time.time() - self.warmed_at >= self.refresh_interval)
+            or (self.epoch_key and self.rcli.get(self.epoch_key) != self.epoch)
+        ):
+            self.warm()
+        result, uncertain = {}, []
+        for key in keys:
+            if key in self.present:
+                self.present.move_to_end(key)
+                self.stats["present_hits"] += 1
+                result[key] = True
+            elif key not in self.bloom:
+                self.stats["absent_hits"] += 1
+                result[key] = False
+            else:
+                uncertain.append(key)
+        if uncertain:
+            pipe = self.rcli.pipeline(transaction=False)
+            for key in uncertain:
+                pipe.exists(key)
+            for key, exists in zip(uncertain, pipe.execute()):
+                result[key] = bool(exists)
+                self.stats["redis_lookups"] += 1
+                if exists:
+                    self._remember(key)
+                else:
+                    self.stats["false_positives"] += 1
+        return result
+
+    def hit_ratio(self) -> float:
+        hits = self.stats["present_hits"] + self.stats["absent_hits"]
+        return hits / max(hits + self.stats["redis_lookups"], 1)
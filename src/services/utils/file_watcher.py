@@ -0,0 +1,175 @@
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+from typing import Callable, Optional
+
+from src.services.utils.logger_utils import getLogger
+
+logger = getLogger(__file__)
+
+POLL_INTERVAL = float(os.environ.get("FILE_WATCH_POLL_INTERVAL", 1))
+RESCAN_INTERVAL = float(os.environ.get("FILE_WATCH_RESCAN_INTERVAL", 300))
+USE_INOTIFY = os.environ.get("FILE_WATCH_INOTIFY", "True").lower() == "true"
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+def _inotify_watch(folder: str) -> Optional[int]:
+    """
+    Watch folder with inotify.
+    :return: The inotify file descriptor, or None when inotify is not available.
+    """
+    if not USE_INOTIFY or not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(fd, os.fsencode(folder), WATCH_MASK) < 0:
+            err = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(err, f"inotify_add_watch failed for {folder}")
+        return fd
+    except (OSError, AttributeError) as err:
+        logger.warning(f"inotify unavailable, falling back to polling: {err}")
+        return None
+
+
+def _read_events(fd: int) -> tuple[set[str], bool]:
+    """
+    Drain pending inotify events.
+    :return: The file names that changed and whether the event queue overflowed.
+    """
+    names: set[str] = set()
+    overflow = False
+    while True:
+        try:
+            buffer = os.read(fd, 64 * 1024)
+        except BlockingIOError:
+            break
+        except OSError as err:
+            if err.errno == errno.EINTR:
+                continue
+            raise
+        if not buffer:
+            break
+        position = 0
+        while position + _EVENT_HEADER.size <= len(buffer):
+            _, mask, _, length = _EVENT_HEADER.unpack_from(buffer, position)
+            position += _EVENT_HEADER.size
+            name = buffer[position : position + length].rstrip(b"\0")
+            position += length
+            if mask & IN_Q_OVERFLOW:
+                overflow = True
+            elif name:
+                names.add(os.fsdecode(name))
+    return names, overflow
+
+
+class DirectoryWatcher:
+    """
+    Report files of a folder that are new or changed (size/mtime) since the last poll.
+
+    Uses inotify where available, otherwise compares (size, mtime) fingerprints
+    every FILE_WATCH_POLL_INTERVAL seconds. A full fingerprint rescan also runs
+    every FILE_WATCH_RESCAN_INTERVAL seconds to catch changes inotify cannot see
+    (e.g. some network or VM shared mounts).
+
+    The first poll reports every existing file.
+    """
+
+    def __init__(self, folder: str, ignore: Callable[[str], bool] = lambda name: False):
+        self.folder = folder
+        self.ignore = ignore
+        self.fingerprints: dict[str, tuple[int, float]] = {}
+        self._fd = _inotify_watch(folder)
+        self._last_rescan = 0.0
+        self._initialized = False
+        logger.info(
+            f"Watching {folder} with {'inotify' if self._fd is not None else 'polling'}."
+        )
+
+    @property
+    def files(self) -> list[str]:
+        return sorted(self.fingerprints.keys())
+
+    def _fingerprint(self, path: str) -> Optional[tuple[int, float]]:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_size, stat.st_mtime
+
+    def _check(self, names) -> set[str]:
+        changed = set()
+        for name in names:
+            if self.ignore(name):
+                continue
+            path = os.path.join(self.folder, name)
+            fingerprint = self._fingerprint(path)
+            if fingerprint is None or not os.path.isfile(path):
+                self.fingerprints.pop(path, None)
+                continue
+            if self.fingerprints.get(path) != fingerprint:
+                self.fingerprints[path] = fingerprint
+                changed.add(path)
+        return changed
+
+    def _rescan(self) -> set[str]:
+        self._last_rescan = time.monotonic()
+        names = os.listdir(self.folder)
+        present = {os.path.join(self.folder, name) for name in names}
+        for path in list(self.fingerprints):
+            if path not in present:
+                self.fingerprints.pop(path)
+        return self._check(names)
+
+    def poll(self, timeout: float = 0) -> set[str]:
+        """
+        Wait up to timeout seconds for changes.
+        :return: Paths of the files that are new or changed.
+        """
+        if not self._initialized:
+            self._initialized = True
+            return self._rescan()
+
+        deadline = time.monotonic() + timeout
+        while True:
+            if time.monotonic() - self._last_rescan >= RESCAN_INTERVAL:
+                changed = self._rescan()
+            elif self._fd is None:
+                changed = self._rescan() if time.monotonic() - self._last_rescan >= POLL_INTERVAL else set()
+            else:
+                names, overflow = _read_events(self._fd)
+                changed = self._rescan() if overflow else self._check(names)
+
+            remaining = deadline - time.monotonic()
+            if changed or remaining <= 0:
+                return changed
+            wait = min(remaining, POLL_INTERVAL if self._fd is None else RESCAN_INTERVAL)
+            if self._fd is None:
+                time.sleep(wait)
+            else:
+                select.select([self._fd], [], [], wait)
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
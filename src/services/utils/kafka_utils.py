@@ -24,6 +24,9 @@ from typing import Callable, Iterator
 
 logger = getLogger(__file__)    
 
+COMMIT_RETRIES = int(os.getenv("KAFKA_COMMIT_RETRIES", 5))
+COMMIT_RETRY_BACKOFF = float(os.getenv("KAFKA_COMMIT_RETRY_BACKOFF", 1))
+
 def create_kafka_producer(config: dict) -> Producer:
     """
     Create a Kafka Producer.
@@ -246,6 +249,45 @@ def kafka_consumer_generator(consumer: Consumer, checkInterruption: Callable = l
             break
 
 
+def commit_offsets(
+    consumer: Consumer,
+    positions: dict[tuple[str, int], int],
+    retries: int = COMMIT_RETRIES,
+    backoff: float = COMMIT_RETRY_BACKOFF,
+) -> bool:
+    """
+    Synchronously commit the positions of the processed messages, retrying on Kafka errors.
+    :param positions: Dictionary {(topic, partition): offset of the next message to read}.
+    :return: False when every attempt failed; the messages are then consumed again
+        after a restart or a rebalance, a later successful commit covers them too.
+    """
+    if not positions:
+        return True
+    offsets = [TopicPartition(topic, partition, offset) for (topic, partition), offset in positions.items()]
+    for attempt in range(1, retries + 1):
+        try:
+            consumer.commit(offsets=offsets, asynchronous=False)
+            return True
+        except KafkaException as e:
+            logger.warning(f"Offset commit failed (attempt {attempt}/{retries}): {e}")
+            time.sleep(backoff * attempt)
+    logger.error(f"Offsets {positions} not committed after {retries} attempts.")
+    return False
+
+
+def rewind(consumer: Consumer, positions: dict[tuple[str, int], int]) -> None:
+    """
+    Seek partitions back, so their messages from these offsets are consumed again.
+    Partitions no longer assigned are skipped, their new owner resumes from the committed offsets.
+    :param positions: Dictionary {(topic, partition): offset}.
+    """
+    for (topic, partition), offset in positions.items():
+        try:
+            consumer.seek(TopicPartition(topic, partition, offset))
+        except KafkaException as e:
+            logger.warning(f"Could not rewind {topic} [{partition}] to {offset}: {e}")
+
+
 def delete_consumer_group(config: dict, group_id: str) -> None:
     """
     Delete a consumer group from Kafka.
@@ -368,3 +410,60 @@ def get_consumer_group_lag(group_id: str, topic: str) -> dict:
 
     consumer.close()
     return lag
+
+
+def get_consumer_group_offsets(group_id: str, topic: str) -> dict[int, int]:
+    """
+    Committed offsets of a consumer group on a topic.
+    :return: Dictionary {partition: offset}, partitions without a commit are omitted.
+    """
+    admin_client = AdminClient(create_admin_config())
+    metadata = admin_client.list_topics(topic=topic, timeout=10)
+    topic_partitions = [TopicPartition(topic, p) for p in metadata.topics[topic].partitions.keys()]
+    futures = admin_client.list_consumer_group_offsets(
+        [ConsumerGroupTopicPartitions(group_id, topic_partitions)]
+    )
+    offsets = {}
+    for _, future in futures.items():
+        for tp in future.result().topic_partitions:
+            if tp.offset >= 0:
+                offsets[tp.partition] = tp.offset
+    return offsets
+
+
+def set_consumer_group_offsets(group_id: str, topic: str, offsets: dict[int, int]) -> None:
+    """
+    Move the offsets of a (inactive) consumer group on a topic.
+    :param offsets: Dictionary {partition: offset}.
+    """
+    logger.info(f"Setting consumer group '{group_id}' offsets on '{topic}' to {offsets}")
+    admin_client = AdminClient(create_admin_config())
+    topic_partitions = [TopicPartition(topic, int(p), int(o)) for p, o in offsets.items()]
+    futures = admin_client.alter_consumer_group_offsets(
+        [ConsumerGroupTopicPartitions(group_id=group_id, topic_partitions=topic_partitions)]
+    )
+    for tp, future in futures.items():
+        try:
+            future.result()
+        except Exception as e:
+            logger.error(f"Failed to set offsets for {tp}: {e}")
+            raise
+
+
+def get_topic_high_watermarks(topic: str) -> dict[int, int]:
+    """
+    Offsets the next message of every partition of a topic will get.
+    :return: Dictionary {partition: offset}, empty when the topic does not exist.
+    """
+    consumer = Consumer(create_consumer_config())
+    try:
+        metadata = consumer.list_topics(topic=topic, timeout=10)
+        if topic not in metadata.topics or metadata.topics[topic].error is not None:
+            return {}
+        offsets = {}
+        for partition in metadata.topics[topic].partitions.keys():
+            _, high = consumer.get_watermark_offsets(TopicPartition(topic, partition), timeout=10)
+            offsets[partition] = high
+        return offsets
+    finally:
+        consumer.close()
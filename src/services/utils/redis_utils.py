@@ -1,10 +1,21 @@
 import os
+import sys
+import json
+import time
 import redis
+import hashlib
+import threading
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from src.services.utils.logger_utils import getLogger
-from redis.commands.search.field import TagField, NumericField, TextField
+from redis.commands.search.field import TagField, NumericField, TextField, GeoField
 from redis.commands.search.index_definition import IndexDefinition
-from functools import lru_cache
+from redis.retry import Retry
+from redis.backoff import EqualJitterBackoff
+from redis.cluster import RedisCluster
+from redis.crc import key_slot
+from collections import defaultdict
+from typing import Optional
 
 logger = getLogger(__file__)
 
@@ -12,49 +23,276 @@ HOST = os.getenv("REDIS_HOST", "redis")
 PORT = int(os.getenv("REDIS_PORT", 6379))
 DB = int(os.getenv("REDIS_DB", 0))
 PASSWORD = os.getenv("REDIS_PASSWORD", None)
+# REDIS_HOST:REDIS_PORT is any node of a Redis Cluster
+CLUSTER = os.getenv("REDIS_CLUSTER", "False").lower() == "true"
+# event keys as fireevent:{Incident_Number}:{revision}, an incident's revisions share a slot
+HASH_TAGS = os.getenv("REDIS_HASH_TAGS", str(CLUSTER)).lower() == "true"
+# the cluster runs a search engine coordinating FT.* commands across its shards;
+# on an OSS cluster every node only indexes its own slots (see require_search)
+SEARCH_COORDINATOR = os.getenv("REDIS_SEARCH_COORDINATOR", "False").lower() == "true"
 
+DELETE_SCAN_COUNT = int(os.getenv("REDIS_DELETE_SCAN_COUNT", 10000))
+DELETE_BATCH_SIZE = int(os.getenv("REDIS_DELETE_BATCH_SIZE", 1000))
+DELETE_WORKERS = int(os.getenv("REDIS_DELETE_WORKERS", 4))
+DELETE_PROGRESS_INTERVAL = float(os.getenv("REDIS_DELETE_PROGRESS_INTERVAL", 5))
 
-@lru_cache(maxsize=1)
-def get_redis_client(host=HOST, port=PORT, db=DB, password=PASSWORD) -> redis.Redis:
+INDEX_BUILD_POLL_INTERVAL = float(os.getenv("REDIS_INDEX_BUILD_POLL_INTERVAL", 5))
+INDEX_BUILD_TIMEOUT = float(os.getenv("REDIS_INDEX_BUILD_TIMEOUT", 0))  # 0 waits forever
+INDEX_DROP_PREVIOUS = os.getenv("REDIS_INDEX_DROP_PREVIOUS", "True").lower() == "true"
+
+POOL_MAX_CONNECTIONS = int(os.getenv("REDIS_POOL_MAX_CONNECTIONS", 50))
+POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", 20))  # seconds waiting for a free connection
+SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", 60))
+SOCKET_CONNECT_TIMEOUT = float(os.getenv("REDIS_SOCKET_CONNECT_TIMEOUT", 5))
+SOCKET_KEEPALIVE = os.getenv("REDIS_SOCKET_KEEPALIVE", "True").lower() == "true"
+HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", 30))
+RETRIES = int(os.getenv("REDIS_RETRIES", 3))
+RETRY_BACKOFF_BASE = float(os.getenv("REDIS_RETRY_BACKOFF_BASE", 0.1))
+RETRY_BACKOFF_CAP = float(os.getenv("REDIS_RETRY_BACKOFF_CAP", 2))
+CLIENT_CACHE_MAX_SIZE = int(os.getenv("REDIS_CLIENT_CACHE_MAX_SIZE", 10000))
+
+
+class InstrumentedConnectionPool(redis.BlockingConnectionPool):
+    """
+    Bounded connection pool (callers wait up to timeout for a free connection
+    instead of opening more) keeping utilization counters, see pool_stats().
+    """
+
+    def reset(self):
+        super().reset()
+        self._stats_lock = threading.Lock()
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.acquired = 0
+        self.wait_seconds = 0.0
+
+    def get_connection(self, *args, **kwargs):
+        start = time.perf_counter()
+        connection = super().get_connection(*args, **kwargs)
+        with self._stats_lock:
+            self.acquired += 1
+            self.wait_seconds += time.perf_counter() - start
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+        return connection
+
+    def release(self, connection):
+        with self._stats_lock:
+            self.in_use = max(self.in_use - 1, 0)
+        super().release(connection)
+
+
+# one client (and pool) per effective configuration, never evicted
+_clients: dict[tuple, redis.Redis] = {}
+_clients_lock = threading.Lock()
+
+
+def get_redis_client(
+    host=HOST, port=PORT, db=DB, password=PASSWORD, decode_responses=True, client_cache=False, cluster=CLUSTER
+) -> redis.Redis:
     """
     Returns a singleton Redis client configured with the provided parameters.
 
+    Calls resolving to the same configuration, whatever their form (defaults,
+    keywords or positional arguments), share one client. The client is
+    thread-safe: commands borrow a connection from a bounded
+    pool (REDIS_POOL_MAX_CONNECTIONS) with socket timeouts, TCP keepalive,
+    health checks of idle connections and retries with jittered exponential
+    backoff on connection errors and timeouts. A bytes client
+    (decode_responses=False) has a pool of its own.
+
     :param host: Redis server host
     :param port: Redis server port
     :param db: Redis database number
     :param password: Redis server password (if any)
+    :param decode_responses: False for a client returning bytes (e.g. DUMP payloads)
+    :param client_cache: RESP3 client-side caching of read commands, the server
+        invalidates cached keys when they change. Only for clients reading keys
+        (GET, HGETALL, ...): FT.* commands are not cached and their RESP3 replies
+        are maps, not the flat arrays the search helpers parse
+    :param cluster: Connect to a Redis Cluster through host:port, commands are
+        routed to the node of their slot and the pool settings apply per node
     :return: Redis client instance
     """
-    logger.debug(f"Connecting to Redis at {host}:{port}, DB: {db}")
-    return redis.Redis(
+    config = (host, int(port), int(db), password, bool(decode_responses), bool(client_cache), bool(cluster))
+    with _clients_lock:
+        if config not in _clients:
+            _clients[config] = _create_redis_client(*config)
+        return _clients[config]
+
+
+def _create_redis_client(host, port, db, password, decode_responses, client_cache, cluster) -> redis.Redis:
+    logger.debug(f"Connecting to Redis{' Cluster' if cluster else ''} at {host}:{port}, DB: {db}")
+    connection_kwargs = {}
+    if client_cache:
+        from redis.cache import CacheConfig
+
+        connection_kwargs.update(protocol=3, cache_config=CacheConfig(max_size=CLIENT_CACHE_MAX_SIZE))
+    if cluster:
+        return RedisCluster(
+            host=host,
+            port=port,
+            password=password,
+            decode_responses=decode_responses,
+            max_connections=POOL_MAX_CONNECTIONS,
+            socket_timeout=SOCKET_TIMEOUT,
+            socket_connect_timeout=SOCKET_CONNECT_TIMEOUT,
+            socket_keepalive=SOCKET_KEEPALIVE,
+            health_check_interval=HEALTH_CHECK_INTERVAL,
+            # node failures and slot moves are retried by the cluster client
+            retry=Retry(EqualJitterBackoff(cap=RETRY_BACKOFF_CAP, base=RETRY_BACKOFF_BASE), RETRIES),
+            **connection_kwargs,
+        )
+    pool = InstrumentedConnectionPool(
+        max_connections=POOL_MAX_CONNECTIONS,
+        timeout=POOL_TIMEOUT,
         host=host,
         port=port,
         db=db,
         password=password,
-        decode_responses=True,  # ensures responses are strings
+        decode_responses=decode_responses,  # ensures responses are strings
+        socket_timeout=SOCKET_TIMEOUT,
+        socket_connect_timeout=SOCKET_CONNECT_TIMEOUT,
+        socket_keepalive=SOCKET_KEEPALIVE,
+        health_check_interval=HEALTH_CHECK_INTERVAL,
+        retry=Retry(EqualJitterBackoff(cap=RETRY_BACKOFF_CAP, base=RETRY_BACKOFF_BASE), RETRIES),
+        retry_on_error=[redis.exceptions.ConnectionError, redis.exceptions.TimeoutError],
+        **connection_kwargs,
     )
+    return redis.Redis(connection_pool=pool)
+
+
+def pool_stats(r: Optional[redis.Redis] = None) -> dict:
+    """
+    Utilization of the connection pool of a client (the default client when None),
+    per node for a cluster client.
+    """
+    r = r or get_redis_client()
+    if isinstance(r, RedisCluster):
+        return {node.name: pool_stats(node.redis_connection) for node in r.get_nodes() if node.redis_connection}
+    pool = r.connection_pool
+    stats = {"max_connections": pool.max_connections}
+    if isinstance(pool, InstrumentedConnectionPool):
+        stats.update(
+            in_use=pool.in_use,
+            peak_in_use=pool.peak_in_use,
+            utilization=round(pool.peak_in_use / pool.max_connections, 3),
+            acquired=pool.acquired,
+            avg_wait_ms=round(pool.wait_seconds / max(pool.acquired, 1) * 1000, 3),
+        )
+    if getattr(pool, "cache", None) is not None:
+        stats["client_cache_size"] = pool.cache.size
+    return stats
+
+
+def hash_tag(value) -> str:
+    """
+    Cluster hash tag: keys sharing it are stored in the same slot.
+    """
+    return f"{{{value}}}"
+
 
+def group_by_slot(keys) -> dict[int, list]:
+    """
+    Group keys by cluster hash slot, for multi-key commands (PFCOUNT, ...) and
+    transactions, which a cluster only runs on keys of a single slot.
+    """
+    groups = defaultdict(list)
+    for key in keys:
+        groups[key_slot(key.encode() if isinstance(key, str) else key)].append(key)
+    return groups
 
-def delete_keys(query: str) -> None:
+
+def delete_keys(
+    query: str,
+    scan_count: int = DELETE_SCAN_COUNT,
+    batch_size: int = DELETE_BATCH_SIZE,
+    workers: int = DELETE_WORKERS,
+) -> int:
     """
     Deletes keys from Redis that match the given query pattern.
+
+    Keys are collected with SCAN (COUNT scan_count) and removed with non-blocking
+    UNLINK, batch_size keys per command, by a pool of workers while scanning goes on.
+    Progress and throughput are logged every DELETE_PROGRESS_INTERVAL seconds.
+
     :param query: Redis key pattern to match (e.g., "user:*")
+    :param scan_count: COUNT hint for each SCAN call
+    :param batch_size: Keys per UNLINK command
+    :param workers: Concurrent UNLINK workers
+    :return: Number of keys deleted
     """
-    global logger
     r = get_redis_client()
-    logger.debug(f"Deleting keys matching pattern: {query}")
-    deleted_count = 0
-    items_iterator = r.scan_iter(query)
-    if not items_iterator:
-        logger.debug(f"No keys found matching pattern '{query}'.")
-        return
-    for item in items_iterator:    
-        r.delete(item)
-        logger.debug(f"Deleted key: {item}")
-        deleted_count += 1
+    if not any(c in query for c in "*?["):
+        logger.warning(f"Pattern '{query}' has no wildcard, only that exact key will be deleted.")
+    logger.info(f"Deleting keys matching pattern: {query}")
 
-    if deleted_count == 0:
+    start = time.time()
+    last_report = start
+    scanned = 0
+    deleted = 0
+    batch: list[str] = []
+    futures = []
+
+    def unlink(keys: list[str]) -> int:
+        return r.unlink(*keys)
+
+    def collect(done_only: bool) -> None:
+        nonlocal deleted, futures
+        pending = []
+        for future in futures:
+            if done_only and not future.done():
+                pending.append(future)
+            else:
+                deleted += future.result()
+        futures = pending
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="unlink") as pool:
+        for key in r.scan_iter(match=query, count=scan_count):
+            batch.append(key)
+            scanned += 1
+            if len(batch) >= batch_size:
+                futures.append(pool.submit(unlink, batch))
+                batch = []
+                # bound the in-flight batches so memory stays flat on huge keyspaces
+                if len(futures) >= workers * 4:
+                    futures[0].result()
+                collect(done_only=True)
+            if time.time() - last_report >= DELETE_PROGRESS_INTERVAL:
+                last_report = time.time()
+                elapsed = last_report - start
+                logger.info(
+                    f"'{query}': scanned {scanned}, deleted {deleted} keys "
+                    f"({deleted / elapsed:.0f} keys/s)."
+                )
+        if batch:
+            futures.append(pool.submit(unlink, batch))
+        collect(done_only=False)
+
+    elapsed = max(time.time() - start, 1e-9)
+    if deleted == 0:
         logger.debug(f"No keys found matching pattern '{query}'.")
+    logger.info(
+        f"Deleted {deleted} keys matching '{query}' in {elapsed:.1f}s "
+        f"({deleted / elapsed:.0f} keys/s)."
+    )
+    return deleted
+
+
+def require_search(r: Optional[redis.Redis] = None) -> None:
+    """
+    Refuse FT.* commands on a Redis Cluster without a search coordinator: a
+    node would only create, build and query an index of its own shard, so
+    searches would silently miss the events of every other shard.
+    :param r: Client about to run the commands, the REDIS_CLUSTER client when None.
+    """
+    cluster = isinstance(r, RedisCluster) if r is not None else CLUSTER
+    if cluster and not SEARCH_COORDINATOR:
+        raise RuntimeError(
+            "RediSearch on a Redis Cluster needs a search coordinator across the shards "
+            "(set REDIS_SEARCH_COORDINATOR=True if the cluster provides one), "
+            "an OSS cluster node only indexes its own keys."
+        )
 
 
 def index_exists(id):
@@ -91,9 +329,131 @@ def create_index(id, schema, prefixes: list[str]):
         logger.debug(f"Index {id} created successfully.")
 
 
-def store_as_hash(key: str, data: dict):
-    rcli = get_redis_client()
-    # Serialize datetime fields to ISO format
+def index_info(id) -> Optional[dict]:
+    """
+    FT.INFO of an index or alias as a dict, None when it does not exist.
+    """
+    try:
+        info = get_redis_client().execute_command("FT.INFO", id)
+    except redis.exceptions.ResponseError:
+        return None
+    return dict(zip(info[::2], info[1::2]))
+
+
+def resolve_alias(alias) -> Optional[str]:
+    """
+    Name of the index behind alias (the alias itself for a plain index), None if unknown.
+    """
+    info = index_info(alias)
+    return info["index_name"] if info else None
+
+
+def versioned_index_name(alias, schema, prefixes: list[str]) -> str:
+    """
+    Index name derived from alias and a fingerprint of its definition, so every
+    schema change gets a new index.
+    """
+    definition = [[f.name, f.as_name, f.args, f.args_suffix] for f in schema] + [sorted(prefixes)]
+    fingerprint = hashlib.sha1(json.dumps(definition, default=str).encode()).hexdigest()[:8]
+    return f"{alias}_{fingerprint}"
+
+
+def wait_for_indexing(id, poll_interval=INDEX_BUILD_POLL_INTERVAL, timeout=INDEX_BUILD_TIMEOUT) -> bool:
+    """
+    Wait until RediSearch has indexed every existing document of an index.
+    :return: False when timeout (seconds, 0 for none) expired first.
+    """
+    start = time.time()
+    while True:
+        info = index_info(id) or {}
+        percent = float(info.get("percent_indexed", 0))
+        if percent >= 1 and str(info.get("indexing", "0")) == "0":
+            logger.info(f"Index {id} built in {time.time() - start:.0f}s ({info.get('num_docs')} docs).")
+            return True
+        if timeout and time.time() - start > timeout:
+            logger.error(f"Index {id} not built after {timeout}s ({percent:.1%}).")
+            return False
+        logger.info(f"Index {id}: {percent:.1%} indexed, {info.get('num_docs')} docs.")
+        time.sleep(poll_interval)
+
+
+def swap_alias(alias, id) -> None:
+    """
+    Point alias to index id. FT.ALIASUPDATE moves an existing alias atomically.
+    A legacy plain index named like the alias has to be dropped (keeping
+    documents) before the name can become an alias: both commands run in one
+    MULTI/EXEC, so no query runs in between and sees neither.
+    """
+    r = get_redis_client()
+    current = resolve_alias(alias)
+    if current == alias:
+        logger.warning(f"Replacing the plain index {alias} by an alias to {id}.")
+        pipe = r.pipeline(transaction=True)
+        pipe.execute_command("FT.DROPINDEX", alias)
+        pipe.execute_command("FT.ALIASADD", alias, id)
+        pipe.execute()
+        logger.info(f"Alias {alias} now points to {id} (was the plain index {alias}).")
+        return
+    r.execute_command("FT.ALIASUPDATE" if current else "FT.ALIASADD", alias, id)
+    logger.info(f"Alias {alias} now points to {id} (was {current}).")
+    if current and current != id and INDEX_DROP_PREVIOUS:
+        r.execute_command("FT.DROPINDEX", current)
+        logger.info(f"Previous index {current} dropped.")
+
+
+def create_versioned_index(alias, schema, prefixes: list[str], background: bool = True) -> str:
+    """
+    Serve an index through alias, without gaps when its schema changes.
+
+    The index for the current schema is created next to the one in use, built by
+    RediSearch while the alias keeps serving the previous one, and the alias is
+    swapped once percent_indexed reaches 100%. Without a previous index the
+    alias is added right away.
+
+    :param background: Wait for the build and swap in a daemon thread.
+    :return: The versioned index name.
+    """
+    require_search()
+    id = versioned_index_name(alias, schema, prefixes)
+    current = resolve_alias(alias)
+    if current == id:
+        return id
+    create_index(id, schema, prefixes)
+    if current is None:
+        swap_alias(alias, id)
+        return id
+
+    logger.info(f"Building {id} to replace {current} behind {alias}.")
+
+    def build_and_swap():
+        if wait_for_indexing(id):
+            swap_alias(alias, id)
+
+    if background:
+        threading.Thread(target=build_and_swap, name=f"build-{id}", daemon=True).start()
+    else:
+        build_and_swap()
+    return id
+
+
+def delete_versioned_index(alias) -> None:
+    """
+    Drop the alias and the index behind it, keeping the documents.
+    """
+    r = get_redis_client()
+    current = resolve_alias(alias)
+    if current and current != alias:
+        r.execute_command("FT.ALIASDEL", alias)
+    if current:
+        r.execute_command("FT.DROPINDEX", current)
+        logger.debug(f"Index '{current}' dropped successfully.")
+
+
+def hash_mapping(data: dict) -> dict:
+    """
+    Serialize a dict to Redis hash fields, in place: datetimes become timestamps,
+    None an empty string and everything else a string.
+    """
     for k, v in data.items():
         if isinstance(v, datetime):
             data[k] = v.timestamp()
@@ -101,9 +461,13 @@ def store_as_hash(key: str, data: dict):
             data[k] = ""  # Store empty string for None values
         else:
             data[k] = str(v)  # Convert to string for Redis
+    return data
 
+
+def store_as_hash(key: str, data: dict):
+    rcli = get_redis_client()
     # Store in Redis as a hash
-    rcli.hset(key, mapping=data)
+    rcli.hset(key, mapping=hash_mapping(data))
 
 
 def get_latest_revision(key_prefix):
@@ -115,7 +479,11 @@ def get_latest_revision(key_prefix):
     latest_revision = None
     highest_revision = -1
 
-    items_iterator = rclient.scan_iter(f"{key_prefix}:*")
+    scan_kwargs = {}
+    if isinstance(rclient, RedisCluster) and "{" in key_prefix:
+        # hash-tagged revisions live on the node of their slot, other nodes are not scanned
+        scan_kwargs["target_nodes"] = rclient.get_node_from_key(key_prefix)
+    items_iterator = rclient.scan_iter(f"{key_prefix}:*", **scan_kwargs)
     for key in items_iterator:
         key_str = key
         try:
@@ -131,3 +499,52 @@ def get_latest_revision(key_prefix):
             continue
 
     return highest_revision
+
+
+# generation field bumped by every write, whatever its partition
+ALL_PARTITIONS = "*"
+# set when generations are reset, so restarted counters never match older ones
+GENERATION_EPOCH = "epoch"
+PARTITION_DAY_FORMAT = "%Y-%m-%d"
+
+
+def day_partition(value: datetime) -> str:
+    return value.strftime(PARTITION_DAY_FORMAT)
+
+
+def bump_generations(key: str, partitions) -> None:
+    """
+    Increment the generation of each written partition (e.g. an Incident_Date day)
+    and of ALL_PARTITIONS, invalidating cached results that depend on them.
+
+    :param key: Hash holding one generation counter per partition.
+    :param partitions: Partitions written since the last bump.
+    """
+    pipe = get_redis_client().pipeline(transaction=False)
+    for partition in set(partitions) | {ALL_PARTITIONS}:
+        pipe.hincrby(key, partition, 1)
+    pipe.execute()
+
+
+def reset_generations(key: str) -> None:
+    """
+    Drop every generation counter and start a new epoch.
+    """
+    pipe = get_redis_client().pipeline(transaction=True)
+    pipe.delete(key)
+    pipe.hset(key, GENERATION_EPOCH, time.time_ns())
+    pipe.execute()
+
+
+def get_generations(key: str, partitions) -> tuple:
+    """
+    Current epoch followed by the generations of partitions, missing ones are 0.
+    """
+    values = get_redis_client().hmget(key, [GENERATION_EPOCH, *partitions])
+    return tuple(int(g or 0) for g in values)
+
+
+if __name__ == "__main__":
+    # usage: python -m src.services.utils.redis_utils "<pattern>" [<pattern> ...]
+    for pattern in sys.argv[1:]:
+        delete_keys(pattern)
@@ -0,0 +1,151 @@
+import os
+import redis
+
+from redis.cluster import RedisCluster
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Optional
+
+from src.services.utils.logger_utils import getLogger
+from src.services.utils.redis_utils import group_by_slot
+
+logger = getLogger(__file__)
+
+SKETCH_KEY_PREFIX = os.getenv("SKETCH_KEY_PREFIX", "fireevent:sketch")
+SKETCH_TOP_K = int(os.getenv("SKETCH_TOP_K", 50))
+SKETCH_CMS_ERROR = float(os.getenv("SKETCH_CMS_ERROR", 0.0001))
+SKETCH_CMS_PROBABILITY = float(os.getenv("SKETCH_CMS_PROBABILITY", 0.001))
+
+# counted dimension -> FireEvent attribute
+FREQUENCY_DIMENSIONS = {"incident_number": "Incident_Number", "id": "ID"}
+DAY_FORMAT = "%Y-%m-%d"
+
+
+class EventSketches:
+    """
+    Streaming sketches of the served events, kept in Redis:
+
+    - HyperLogLog of distinct Incident_Numbers per day, per battalion/day and per district/day
+    - Count-Min sketch and Top-K of the most frequent Incident_Numbers and IDs (RedisBloom)
+
+    Every serving replica writes to the same keys, so sketches are merged by
+    construction and every query is a single O(1) Redis command. Updates are
+    pre-aggregated in memory by add() and sent in one pipeline by flush().
+    """
+
+    def __init__(self, rcli: redis.Redis, prefix: str = SKETCH_KEY_PREFIX, top_k: int = SKETCH_TOP_K):
+        self.rcli = rcli
+        self.prefix = prefix
+        self.top_k = top_k
+        self._distinct: dict[str, set] = defaultdict(set)
+        self._frequencies: dict[str, Counter] = defaultdict(Counter)
+
+    def hll_key(self, day: str, battalion: Optional[str] = None, district: Optional[str] = None) -> str:
+        if battalion:
+            return f"{self.prefix}:hll:battalion:{battalion}:{day}"
+        if district:
+            return f"{self.prefix}:hll:district:{district}:{day}"
+        return f"{self.prefix}:hll:day:{day}"
+
+    def cms_key(self, dimension: str) -> str:
+        return f"{self.prefix}:cms:{dimension}"
+
+    def topk_key(self, dimension: str) -> str:
+        return f"{self.prefix}:topk:{dimension}"
+
+    def ensure(self) -> None:
+        """
+        Create the Count-Min and Top-K sketches if they do not exist yet.
+        """
+        for dimension in FREQUENCY_DIMENSIONS:
+            for key, command in [
+                (self.cms_key(dimension), ["CMS.INITBYPROB", SKETCH_CMS_ERROR, SKETCH_CMS_PROBABILITY]),
+                (self.topk_key(dimension), ["TOPK.RESERVE", self.top_k]),
+            ]:
+                if self.rcli.exists(key):
+                    continue
+                try:
+                    self.rcli.execute_command(command[0], key, *command[1:])
+                    logger.debug(f"Sketch {key} created.")
+                except redis.exceptions.ResponseError as err:
+                    # another replica created it first
+                    logger.debug(f"Sketch {key} not created: {err}")
+
+    def add(self, event) -> None:
+        """
+        Account one FireEvent, sent to Redis on the next flush().
+        """
+        if event.Incident_Date:
+            day = event.Incident_Date.strftime(DAY_FORMAT)
+            self._distinct[self.hll_key(day)].add(event.Incident_Number)
+            if event.Battalion:
+                self._distinct[self.hll_key(day, battalion=event.Battalion)].add(event.Incident_Number)
+            if event.neighborhood_district:
+                self._distinct[self.hll_key(day, district=event.neighborhood_district)].add(event.Incident_Number)
+        for dimension, attribute in FREQUENCY_DIMENSIONS.items():
+            value = getattr(event, attribute)
+            if value:
+                self._frequencies[dimension][str(value)] += 1
+
+    def flush(self) -> None:
+        """
+        Send the pending updates in a single pipeline.
+        """
+        if not self._distinct and not self._frequencies:
+            return
+        pipe = self.rcli.pipeline(transaction=False)
+        for key, members in self._distinct.items():
+            pipe.pfadd(key, *members)
+        for dimension, counts in self._frequencies.items():
+            pairs = [x for item, count in counts.items() for x in (item, count)]
+            pipe.execute_command("CMS.INCRBY", self.cms_key(dimension), *pairs)
+            pipe.execute_command("TOPK.INCRBY", self.topk_key(dimension), *pairs)
+        pipe.execute()
+        logger.debug(
+            f"Flushed sketches: {len(self._distinct)} HLLs, "
+            f"{sum(len(c) for c in self._frequencies.values())} frequent items."
+        )
+        self.discard()
+
+    def discard(self) -> None:
+        """
+        Drop the pending updates, e.g. of a batch that will be consumed again.
+        """
+        self._distinct.clear()
+        self._frequencies.clear()
+
+    def distinct_incidents(
+        self,
+        start: datetime,
+        end: Optional[datetime] = None,
+        battalion: Optional[str] = None,
+        district: Optional[str] = None,
+    ) -> int:
+        """
+        Approximate number of distinct Incident_Numbers between start and end (inclusive days).
+        """
+        end = end or start
+        days = [(start + timedelta(days=i)).strftime(DAY_FORMAT) for i in range((end - start).days + 1)]
+        keys = [self.hll_key(day, battalion, district) for day in days]
+        if isinstance(self.rcli, RedisCluster):
+            # PFCOUNT only merges keys of one slot; an incident has a single
+            # Incident_Date, so days never share incidents and the counts add up
+            return sum(self.rcli.pfcount(*group) for group in group_by_slot(keys).values())
+        return self.rcli.pfcount(*keys)
+
+    def top(self, dimension: str = "incident_number") -> list[tuple[str, int]]:
+        """
+        Most frequent items of a dimension ("incident_number" or "id") with their approximate counts.
+        """
+        reply = self.rcli.execute_command("TOPK.LIST", self.topk_key(dimension), "WITHCOUNT")
+        return sorted(
+            ((item, int(count)) for item, count in zip(reply[::2], reply[1::2])),
+            key=lambda pair: pair[1],
+            reverse=True,
+        )
+
+    def frequency(self, dimension: str, *items: str) -> list[int]:
+        """
+        Approximate (never under-estimated) occurrences of items in a dimension.
+        """
+        return [int(c) for c in self.rcli.execute_command("CMS.QUERY", self.cms_key(dimension), *items)]